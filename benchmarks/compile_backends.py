@@ -0,0 +1,63 @@
+"""Compares the pure Python and native (Cython) compiled schema backends.
+
+Run from the repository root with `python -m benchmarks.compile_backends`.
+"""
+import timeit
+
+from koalified import native
+from koalified.schema import Schema
+
+SCHEMA = """
+id!: int!=
+name:
+    - str= longest=64:int cut=true:bool strip=true:bool
+    - match [A-z]
+status: one_of active inactive pending
+age~2: int= minimum=0:int maximum=150:int
+score: float= minimum=0.0:float maximum=1.0:float
+tags+: str= lower=true:bool
+address:
+    street: str=
+    city: str=
+    postal: postal
+contact+:
+    kind: one_of phone fax email
+    value!: str=
+'**': str=
+"""
+
+RECORD = {
+    "id": "1234",
+    "name": "  Timothy  ",
+    "status": "Active",
+    "age": "29",
+    "score": "0.75",
+    "tags": ["A", "B", "C"],
+    "address": {"street": "1 Main St", "city": "Seattle", "postal": "98101"},
+    "contact": [{"kind": "phone", "value": "555"}, {"kind": "email", "value": "t@example.com"}],
+    "source": "partner",
+    "batch": 17,
+}
+
+
+def main(number=20000):
+    if not native.cythonize:
+        print("Cython is not installed, only the pure Python backend is available")
+        return
+
+    python_schema = Schema(text=SCHEMA, native=False, precompile=True)
+    native_schema = Schema(text=SCHEMA, native=True, precompile=True)
+    # a failed build falls back to Python with a warning, which would make this compare nothing
+    assert native_schema.compiled().__module__ is not None, "the native module was not built"
+    assert python_schema(dict(RECORD)) == native_schema(dict(RECORD))
+
+    results = {}
+    for name, schema in (("python", python_schema), ("native", native_schema)):
+        seconds = min(timeit.repeat(lambda: schema(dict(RECORD)), number=number, repeat=5))
+        results[name] = seconds
+        print("{:>8}: {:.2f} us per record".format(name, seconds / number * 1000000))
+    print(" speedup: {:.2f}x".format(results["python"] / results["native"]))
+
+
+if __name__ == "__main__":
+    main()
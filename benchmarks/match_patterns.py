@@ -0,0 +1,53 @@
+"""Compares prepared `match` patterns against matching uncompiled patterns on every call.
+
+Run from the repository root with `python -m benchmarks.match_patterns`.
+"""
+import re
+import timeit
+
+from koalified import types
+from koalified.schema import Schema
+
+
+def uncompiled_match(value, regex):
+    """The previous `match` implementation, which relies on the `re` module's own cache"""
+    if not re.match(regex, value):
+        raise ValueError("Provided value of {} does not match {}".format(value, regex))
+    return value
+
+
+def uncompiled_match_any(value, *regexes):
+    for regex in regexes:
+        if re.match(regex, value):
+            return value
+    raise ValueError("Provided value of {} does not match any pattern".format(value))
+
+
+def main(fields=2000, alternatives=2000, number=20):
+    patterns = ["^{}-[0-9]+$".format(index) for index in range(max(fields, alternatives))]
+    text = "\n".join('f{}: "match {}"'.format(index, patterns[index]) for index in range(fields))
+    record = {"f{}".format(index): "{}-42".format(index) for index in range(fields)}
+    alternation = "kind: match_any {}".format(" ".join(patterns[:alternatives]))
+    last_alternative = "{}-7".format(alternatives - 1)
+
+    uncompiled_types = types.built_in.copy()
+    uncompiled_types.register("match", uncompiled_match, pure=True, cost=2)
+    uncompiled_types.register("match_any", uncompiled_match_any, pure=True, cost=3)
+    backends = (("uncompiled", uncompiled_types), ("prepared", types.built_in))
+    cases = (
+        ("{} match fields".format(fields), text, record),
+        ("match_any of {}".format(alternatives), alternation, {"kind": last_alternative}),
+    )
+    for name, schema_text, case_record in cases:
+        results = {}
+        for backend, supported_types in backends:
+            schema = Schema(text=schema_text, supported_types=supported_types, native=False)
+            assert schema(dict(case_record))["__metadata__"]["score"] == 1.0
+            seconds = min(timeit.repeat(lambda: schema(dict(case_record)), number=number, repeat=5))
+            results[backend] = seconds
+            print("{}, {}: {:.1f} us per record".format(name, backend, seconds / number * 1000000))
+        print("{}, speedup: {:.2f}x".format(name, results["uncompiled"] / results["prepared"]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,259 @@
+"""Analyzes how complex a schema is and estimates what validating a record with it costs"""
+import copy
+import timeit
+from time import perf_counter
+
+from koalified.compile import (
+    _parse_validator,
+    _prepared_arguments,
+    _prepared_name,
+    _read_construct,
+    _read_validator,
+    to_code,
+    to_python,
+)
+
+EXPENSIVE_COST = 10
+SLOW_FIELD_SECONDS = 0.00001
+DEEP_NESTING = 4
+SAMPLES = {
+    "bool": "true",
+    "int": "42",
+    "float": "4.2",
+    "str": "koalified",
+    "match": "koalified",
+    "match_any": "koalified",
+    "ip": "192.168.0.1",
+    "phone": "+1 410 555 0100",
+    "date": "2019-01-01",
+    "datetime": "2019-01-01 10:30",
+    "strict_date": "2019-01-01",
+    "strict_datetime": "2019-01-01 10:30",
+    "postal": "98101",
+    "country": "US",
+    "email": "tim@example.com",
+    "domain": "example.com",
+    "mac": "00:1B:44:11:3A:B7",
+    "md5": "d41d8cd98f00b204e9800998ecf8427e",
+    "sha1": "da39a3ee5e6b4b0d3255bfef95601890afd80709",
+    "uuid": "2bc1c94f-0deb-43e9-92a1-4775189ec9f8",
+    "slug": "koalified-schema",
+    "iban": "GB82WEST12345698765432",
+    "dict": {},
+    "list": [],
+    "tuple": [],
+    "set": [],
+}
+
+
+def analyze(schema, number=1000):
+    """Returns a report of the schema's structure, compiled size and estimated cost per record.
+
+    Each validator is timed `number` times against a sample value that it accepts, and the
+    estimated cost per record is the sum over all validators, counting fields that allow
+    multiple values and extra fields (`**`) once. Validators that accept none of the samples,
+    such as `match` with an unusual pattern, are timed rejecting one, and the fields they belong
+    to are listed as `approximate`.
+    """
+    fields = []
+    _fields(schema.definition, fields)
+    prepared = _prepared_arguments(schema)
+    timings = {}
+    for field in fields:
+        field_timings = [
+            _time(schema, validator, prepared, timings, number) for validator in field["validators"]
+        ]
+        field["seconds"] = sum(seconds for seconds, _ in field_timings)
+        field["approximate"] = not all(accepted for _, accepted in field_timings)
+
+    compile_seconds, code = _compile(schema)
+    type_counts = {}
+    for field in fields:
+        for name in field["types"]:
+            type_counts[name] = type_counts.get(name, 0) + 1
+
+    return {
+        "schema_version": schema.version,
+        "fields": len([field for field in fields if not field["group"]]),
+        "groups": len([field for field in fields if field["group"]]),
+        "required": len([field for field in fields if field["required"]]),
+        "multiple": len([field for field in fields if field["multiple"]]),
+        "depth": max([field["depth"] for field in fields] or [0]),
+        "validators": sum(len(field["validators"]) for field in fields),
+        "max_validators": max([len(field["validators"]) for field in fields] or [0]),
+        "types": type_counts,
+        "expensive_types": sorted(name for name in type_counts if _expensive(schema, name)),
+        "code_lines": code.count("\n") + 1,
+        "code_bytes": len(code.encode("utf8")),
+        "compile_seconds": compile_seconds,
+        "estimated_seconds": sum(field["seconds"] for field in fields),
+        "field_seconds": {
+            field["path"]: field["seconds"] for field in fields if field["validators"]
+        },
+        "approximate": [field["path"] for field in fields if field["approximate"]],
+        "hot_spots": _hot_spots(schema, fields),
+    }
+
+
+def format_report(report):
+    """Returns a report as readable text"""
+    lines = [
+        "schema version: {}".format(report["schema_version"]),
+        "fields: {} in {} nested groups, {} required, {} multiple".format(
+            report["fields"], report["groups"], report["required"], report["multiple"]
+        ),
+        "nesting depth: {}".format(report["depth"]),
+        "validators: {}, at most {} per field".format(
+            report["validators"], report["max_validators"]
+        ),
+        "types used: {}".format(
+            ", ".join(
+                "{} ({})".format(name, count) for name, count in sorted(report["types"].items())
+            )
+            or "none"
+        ),
+        "expensive types: {}".format(", ".join(report["expensive_types"]) or "none"),
+        "generated code: {} lines, {} bytes, compiled in {:.1f} ms".format(
+            report["code_lines"], report["code_bytes"], report["compile_seconds"] * 1000
+        ),
+        "estimated cost: {:.1f} us per record".format(report["estimated_seconds"] * 1000000),
+    ]
+    slowest = sorted(report["field_seconds"].items(), key=lambda item: item[1], reverse=True)[:5]
+    for field_path, seconds in slowest:
+        lines.append("    {}: {:.1f} us".format(field_path, seconds * 1000000))
+    if report["approximate"]:
+        lines.append(
+            "approximate, no sample was accepted: {}".format(", ".join(report["approximate"]))
+        )
+    lines.append("hot spots:" if report["hot_spots"] else "hot spots: none")
+    lines.extend("    " + hot_spot for hot_spot in report["hot_spots"])
+    return "\n".join(lines)
+
+
+def _fields(definition, fields, path=(), depth=1):
+    for key, validators in definition.items():
+        field = _read_construct(key)
+        field_path = ".".join(path + (field.name,))
+        group = type(validators) == dict
+        if group:
+            nested, validators = validators, []
+        else:
+            validators = [validators] if type(validators) == str else validators or []
+        fields.append(
+            {
+                "path": field_path,
+                "group": group,
+                "required": field.required,
+                "multiple": field.multiple,
+                "extra": field.name == "**",
+                "depth": depth,
+                "validators": validators,
+                "types": [_parse_validator(validator)[0].name for validator in validators],
+            }
+        )
+        if group:
+            _fields(nested, fields, path + (field.name,), depth + 1)
+
+
+def _time(schema, string, prepared, timings, number):
+    """Returns the seconds a single call of a validator takes, and if it accepted the sample"""
+    if string in timings:
+        return timings[string]
+
+    validator = _read_validator(schema, string)
+    name = validator.construct.name
+    function = schema.supported_types[name]
+    args = tuple(validator.args)
+    if schema.supported_types.info(name).prepare:
+        args = prepared[_prepared_name(validator)]
+    candidates = [SAMPLES.get(name, "koalified")]
+    candidates.extend(arg for arg in validator.args if type(arg) == str)
+    # bounds are within range, such as for an `int` with a `maximum` below the sample
+    candidates.extend(
+        str(validator.kwargs[bound])
+        for bound in ("minimum", "maximum")
+        if bound in validator.kwargs
+    )
+    candidates.extend(SAMPLES.values())
+    sample, accepted = _sample(function, args, validator.kwargs, candidates)
+
+    def call():
+        try:
+            function(sample, *args, **validator.kwargs)
+        except Exception:
+            pass
+
+    timings[string] = (min(timeit.repeat(call, number=number, repeat=3)) / number, accepted)
+    return timings[string]
+
+
+def _sample(function, args, kwargs, candidates):
+    """Returns the first candidate the validator accepts, or the first one if it accepts none"""
+    for candidate in candidates:
+        try:
+            function(candidate, *args, **kwargs)
+        except Exception:
+            continue
+        return candidate, True
+    return candidates[0], False
+
+
+def _compile(schema):
+    """Returns how long compiling the schema with the Python backend takes, and the code"""
+    schema = copy.copy(schema)
+    schema.native = False
+    schema.profiler = None
+    start = perf_counter()
+    to_python(schema)
+    return perf_counter() - start, to_code(schema)[0]
+
+
+def _expensive(schema, name):
+    cost = schema.supported_types.info(name).cost
+    return cost is not None and cost >= EXPENSIVE_COST
+
+
+def _hot_spots(schema, fields):
+    hot_spots = []
+    for field in fields:
+        if field["extra"] and field["validators"] and not schema.passthrough_extra:
+            hot_spots.append(
+                "{}: every extra field is run through its validators one at a time".format(
+                    field["path"]
+                )
+            )
+        if field["group"] and field["multiple"]:
+            hot_spots.append("{}: nested fields are validated once per item".format(field["path"]))
+        if field["seconds"] >= SLOW_FIELD_SECONDS:
+            hot_spots.append(
+                "{}: validators take {:.1f} us".format(field["path"], field["seconds"] * 1000000)
+            )
+        if field["depth"] > DEEP_NESTING:
+            hot_spots.append("{}: nested {} levels deep".format(field["path"], field["depth"]))
+
+    expensive = sorted(
+        set(name for field in fields for name in field["types"] if _expensive(schema, name))
+    )
+    if expensive and schema.cache is None:
+        impure = [name for name in expensive if not schema.supported_types.info(name).pure]
+        hot_spots.append(
+            "expensive types {} run on every record without a cache{}".format(
+                ", ".join(expensive),
+                " ({} can not be cached)".format(", ".join(impure)) if impure else "",
+            )
+        )
+    unknown_cost = sorted(
+        set(
+            name
+            for field in fields
+            for name in field["types"]
+            if schema.supported_types.info(name).cost is None
+        )
+    )
+    if unknown_cost and schema.cost_order:
+        hot_spots.append(
+            "types {} have no cost estimate, so cost_order never moves their validators".format(
+                ", ".join(unknown_cost)
+            )
+        )
+    return hot_spots
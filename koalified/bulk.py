@@ -0,0 +1,222 @@
+"""Validates large newline delimited JSON files in parallel"""
+import json
+import mmap
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import xxhash
+from koalified import ingest, instrument
+
+HISTOGRAM_BINS = 10
+SHARD = re.compile(r"^(?:valid|rejected)-(\d+)\.ndjson(?:\.tmp)?$")
+# schema options that change what is written for a record, which a resumed job must match
+OUTPUT_OPTIONS = (
+    "fail_fast",
+    "score_fields",
+    "explain",
+    "passthrough_extra",
+    "min_score",
+    "required_first",
+    "ordering",
+    "cost_order",
+)
+_schema = None
+
+
+def validate_file(
+    path, schema, output, workers=None, chunk_size=64 * 1024 * 1024, progress=None, resume=True
+):
+    """Validates every record of a newline delimited JSON file, returning aggregate statistics.
+
+    The file is memory mapped and split into chunks at newline boundaries that are validated in a
+    pool of `workers` processes. Each chunk writes its valid outputs to `valid-<chunk>.ndjson` and
+    its rejected records to `rejected-<chunk>.ndjson` within the `output` directory. Completed
+    chunks are recorded in `checkpoint.json`, so that a restarted job with `resume` set only
+    validates the chunks that did not finish. Chunks are only reused if the file, its modification
+    time, the schema definition and the options in `OUTPUT_OPTIONS` are unchanged. Shards left by
+    an earlier run with more chunks are removed. `progress`, if given, is called with the number
+    of completed and total chunks whenever a chunk finishes.
+    """
+    os.makedirs(output, exist_ok=True)
+    chunks = _chunks(path, chunk_size)
+    checkpoint_path = os.path.join(output, "checkpoint.json")
+    source = os.stat(path)
+    checkpoint = {
+        "source": os.path.abspath(path),
+        "size": source.st_size,
+        "mtime": source.st_mtime_ns,
+        "chunk_size": chunk_size,
+        "schema_version": schema.version,
+        "definition": xxhash.xxh64(
+            json.dumps(schema.definition, sort_keys=True, default=str)
+        ).intdigest(),
+        # round tripped, so the options compare equal to those loaded from the checkpoint
+        "options": json.loads(
+            json.dumps({option: getattr(schema, option) for option in OUTPUT_OPTIONS}, default=str)
+        ),
+        "chunks": {},
+    }
+    if resume and os.path.exists(checkpoint_path):
+        with open(checkpoint_path) as checkpoint_file:
+            previous = json.load(checkpoint_file)
+        if all(previous.get(key) == value for key, value in checkpoint.items() if key != "chunks"):
+            checkpoint["chunks"] = previous["chunks"]
+    _remove_shards(output, len(chunks))
+
+    completed = checkpoint["chunks"]
+    pending = [index for index in range(len(chunks)) if str(index) not in completed]
+    if progress:
+        progress(len(completed), len(chunks))
+    with instrument.hooks.span("koalified.validate_file", path=path, chunks=len(pending)):
+        if pending:
+            with ProcessPoolExecutor(workers, initializer=_set_schema, initargs=(schema,)) as pool:
+                futures = {
+                    pool.submit(_validate_chunk, path, output, index, *chunks[index]): index
+                    for index in pending
+                }
+                for future in as_completed(futures):
+                    stats = completed[str(futures[future])] = future.result()
+                    _write_checkpoint(checkpoint_path, checkpoint)
+                    _report(stats)
+                    if progress:
+                        progress(len(completed), len(chunks))
+
+    return _combine(completed.values(), len(chunks))
+
+
+def _remove_shards(output, start):
+    """Removes the shards of chunks from `start` on, left behind by a run with more chunks"""
+    for name in os.listdir(output):
+        match = SHARD.match(name)
+        if match and int(match.group(1)) >= start:
+            os.remove(os.path.join(output, name))
+
+
+def _report(stats):
+    """Reports the statistics of a validated chunk to the instrumentation hooks"""
+    hooks = instrument.hooks
+    if not hooks.enabled:
+        return
+
+    hooks.count("koalified.records", stats["records"])
+    hooks.count("koalified.rejected", stats["rejected"] - stats["errors"])
+    hooks.count("koalified.errors", stats["errors"])
+    for index, count in enumerate(stats["histogram"]):
+        if count:
+            hooks.observe("koalified.score", (index + 0.5) / HISTOGRAM_BINS, count)
+
+
+def _chunks(path, chunk_size):
+    chunks = []
+    with open(path, "rb") as source:
+        if not os.fstat(source.fileno()).st_size:
+            return chunks
+
+        with mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            start = 0
+            size = len(data)
+            while start < size:
+                end = min(start + chunk_size, size)
+                if end < size:
+                    newline = data.find(b"\n", end - 1)
+                    end = size if newline == -1 else newline + 1
+                chunks.append((start, end))
+                start = end
+
+    return chunks
+
+
+def _set_schema(schema):
+    global _schema
+    _schema = schema
+
+
+def _validate_chunk(path, output, index, start, end):
+    stats = {
+        "records": 0,
+        "valid": 0,
+        "rejected": 0,
+        "errors": 0,
+        "score_total": 0.0,
+        "score_min": None,
+        "score_max": None,
+        "histogram": [0] * HISTOGRAM_BINS,
+    }
+    valid_path = os.path.join(output, "valid-{:05d}.ndjson".format(index))
+    rejected_path = os.path.join(output, "rejected-{:05d}.ndjson".format(index))
+    with open(valid_path + ".tmp", "wb") as valid, open(rejected_path + ".tmp", "wb") as rejected:
+        with open(path, "rb") as source:
+            with mmap.mmap(source.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                _validate_lines(data, start, end, valid, rejected, stats)
+
+    os.replace(valid_path + ".tmp", valid_path)
+    os.replace(rejected_path + ".tmp", rejected_path)
+    return stats
+
+
+def _validate_lines(data, start, end, valid, rejected, stats):
+    view = memoryview(data)
+    for line_start, line_end in ingest.line_spans(data, start, end):
+        line = view[line_start:line_end]
+        stats["records"] += 1
+        try:
+            result = _schema(ingest.loads(line))
+            error = "rejected" if result["__metadata__"].get("rejected", False) else None
+        except Exception as exception:
+            error = "{}: {}".format(type(exception).__name__, exception)
+            stats["errors"] += 1
+
+        if error:
+            stats["rejected"] += 1
+            rejected_record = {
+                "offset": line_start,
+                "error": error,
+                "record": line.tobytes().decode("utf8", "replace"),
+            }
+            rejected.write(ingest.dumps(rejected_record) + b"\n")
+            continue
+
+        score = result["__metadata__"]["score"]
+        stats["valid"] += 1
+        stats["score_total"] += score
+        if stats["score_min"] is None or score < stats["score_min"]:
+            stats["score_min"] = score
+        if stats["score_max"] is None or score > stats["score_max"]:
+            stats["score_max"] = score
+        stats["histogram"][_score_bin(score)] += 1
+        valid.write(ingest.dumps(result) + b"\n")
+
+
+def _score_bin(score):
+    return max(min(int(score * HISTOGRAM_BINS), HISTOGRAM_BINS - 1), 0)
+
+
+def _write_checkpoint(checkpoint_path, checkpoint):
+    with open(checkpoint_path + ".tmp", "w") as checkpoint_file:
+        json.dump(checkpoint, checkpoint_file)
+    os.replace(checkpoint_path + ".tmp", checkpoint_path)
+
+
+def _combine(chunk_stats, chunks):
+    totals = {"chunks": chunks, "records": 0, "valid": 0, "rejected": 0, "errors": 0}
+    score_total = 0.0
+    scores_min = []
+    scores_max = []
+    histogram = [0] * HISTOGRAM_BINS
+    for stats in chunk_stats:
+        for key in ("records", "valid", "rejected", "errors"):
+            totals[key] += stats.get(key, 0)
+        score_total += stats["score_total"]
+        if stats["score_min"] is not None:
+            scores_min.append(stats["score_min"])
+            scores_max.append(stats["score_max"])
+        histogram = [total + count for total, count in zip(histogram, stats["histogram"])]
+
+    totals["score"] = {
+        "mean": score_total / totals["valid"] if totals["valid"] else None,
+        "min": min(scores_min) if scores_min else None,
+        "max": max(scores_max) if scores_max else None,
+        "histogram": histogram,
+    }
+    return totals
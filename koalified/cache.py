@@ -0,0 +1,84 @@
+"""A bounded, content addressed cache of validation results for repeated records.
+Records are looked up by a hash of their repr, and each entry keeps that repr so a hash collision
+is never mistaken for a hit. Compiled schemas also cache the items of nested fields that allow
+multiple values here, each under the scope of its field path.
+"""
+
+import copy
+from collections import OrderedDict
+
+import xxhash
+
+
+class ValidationCache(object):
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._results = OrderedDict()
+
+    @staticmethod
+    def key(record, scope=None):
+        return xxhash.xxh64(_text(record, scope).encode("utf8")).intdigest()
+
+    def apply(self, apply_schema, record, scope=None):
+        """Returns a copy of the cached result for the record, validating and caching it if needed"""
+        text = _text(record, scope)
+        key = xxhash.xxh64(text.encode("utf8")).intdigest()
+        result = self._results.get(key, None)
+        if result is not None and result[0] == text:
+            self.hits += 1
+            self._results.move_to_end(key)
+            _, valid, output = result
+            if not valid:
+                raise copy.copy(output)
+            return _copy(output)
+
+        self.misses += 1
+        try:
+            output = apply_schema(record)
+        except Exception as error:
+            # cached errors are copied, so they never hold on to a traceback and its frames
+            self._store(key, (text, False, copy.copy(error)))
+            raise
+        # outputs can share lists and dictionaries with the record, which the caller may change
+        self._store(key, (text, True, _copy(output)))
+        return output
+
+    def _store(self, key, result):
+        self._results[key] = result
+        self._results.move_to_end(key)
+        if len(self._results) > self.maxsize:
+            self._results.popitem(last=False)
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate,
+            "size": len(self._results),
+            "maxsize": self.maxsize,
+        }
+
+    def clear(self):
+        self._results.clear()
+
+
+def _text(record, scope):
+    """Returns the text a record is cached by, where a repr never contains a null character"""
+    return repr(record) if scope is None else "{}\0{}".format(scope, repr(record))
+
+
+def _copy(value):
+    """Copies the containers of a validation result, which is much faster than copy.deepcopy"""
+    value_type = type(value)
+    if value_type == dict:
+        return {key: _copy(item) for key, item in value.items()}
+    elif value_type == list:
+        return [_copy(item) for item in value]
+    return value
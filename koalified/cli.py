@@ -0,0 +1,37 @@
+"""The koalified command line interface"""
+import argparse
+import json
+import sys
+
+from koalified.analyze import analyze, format_report
+from koalified.schema import Schema
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="koalified", description="For when truth is a little fuzzy."
+    )
+    commands = parser.add_subparsers(dest="command")
+    analyze_parser = commands.add_parser(
+        "analyze", help="report a schema's complexity and estimated cost per record"
+    )
+    analyze_parser.add_argument("schema", help="path or http location of the schema")
+    analyze_parser.add_argument(
+        "--number", type=int, default=1000, help="calls per validator micro-benchmark"
+    )
+    analyze_parser.add_argument("--json", action="store_true", help="output the report as JSON")
+    arguments = parser.parse_args(argv)
+    if arguments.command != "analyze":
+        parser.print_help()
+        return 2
+
+    report = analyze(Schema(uri=arguments.schema, native=False), number=arguments.number)
+    if arguments.json:
+        print(json.dumps(report, indent=2, sort_keys=True))
+    else:
+        print(format_report(report))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
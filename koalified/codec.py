@@ -0,0 +1,320 @@
+"""A compact binary encoding for validated records that uses the schema instead of repeating keys.
+
+Fields defined by the schema are written positionally, after a bitmap of which are present, while
+any other keys are written with their name. Integers are zigzag varints, floats are packed doubles
+and values of `one_of` fields are written as their index within the allowed values. Values that
+have no encoding of their own, such as ip addresses, are written as strings.
+
+Encoded records, and streams of them, start with a header holding the format version and a hash
+of the field layout, so data is never decoded with a schema that lays out fields differently.
+"""
+import struct
+from collections import namedtuple
+
+import xxhash
+from koalified.compile import _read_construct, _read_validator
+
+FORMAT_VERSION = 1
+NONE, FALSE, TRUE, INT, FLOAT, STRING, LIST, MAP, ENUM, RECORD = range(10)
+METADATA_FIELDS = ("schema_version", "score", "field_scores", "explain_scores", "rejected")
+
+table = namedtuple("Table", ["names", "indexes", "children", "enums"])
+_double = struct.Struct("<d")
+_header = struct.Struct("<BI")
+
+
+class Codec(object):
+    def __init__(self, schema):
+        self.table = _table(schema, schema.definition)
+        field_paths = tuple(_field_paths(schema.definition))
+        metadata = table(METADATA_FIELDS, _indexes(METADATA_FIELDS), {}, {})
+        metadata.children[METADATA_FIELDS.index("field_scores")] = table(
+            field_paths, _indexes(field_paths), {}, {}
+        )
+        self.table.children[0] = metadata
+        self.header = _header.pack(FORMAT_VERSION, xxhash.xxh32(repr(self.table)).intdigest())
+
+    def encode(self, record):
+        return self.header + self.encode_body(record)
+
+    def decode(self, buffer):
+        buffer = memoryview(buffer)
+        self.check_header(buffer[: _header.size])
+        return self.decode_body(buffer[_header.size :])
+
+    def encode_body(self, record):
+        """Encodes a record without the header"""
+        output = bytearray()
+        _encode_record(output, record, self.table)
+        return bytes(output)
+
+    def decode_body(self, buffer):
+        """Decodes a record encoded by `encode_body`, raising a ValueError if it is malformed"""
+        buffer = memoryview(buffer)
+        try:
+            value, position = _decode_record(buffer, 0, self.table)
+        except (IndexError, KeyError, TypeError, AttributeError, RecursionError, struct.error):
+            raise ValueError("Encoded record is truncated, corrupted or does not match the schema")
+        if position != len(buffer):
+            raise ValueError("Encoded record has {} trailing bytes".format(len(buffer) - position))
+        return value
+
+    def check_header(self, header):
+        """Raises a ValueError unless the header was written by a codec with the same layout"""
+        if bytes(header) == self.header:
+            return
+        if len(header) < _header.size:
+            raise ValueError("Encoded data is too short to have a header")
+        version, _ = _header.unpack(header)
+        if version != FORMAT_VERSION:
+            raise ValueError("Encoded data uses unsupported format version {}".format(version))
+        raise ValueError("Encoded data was written with a schema of a different field layout")
+
+    def writer(self, stream):
+        return RecordWriter(stream, self)
+
+    def reader(self, stream):
+        return RecordReader(stream, self)
+
+
+class RecordWriter(object):
+    """Writes the codec's header followed by length prefixed encoded records to a binary stream"""
+
+    def __init__(self, stream, codec):
+        self.stream = stream
+        self.codec = codec
+        self.stream.write(codec.header)
+
+    def write(self, record):
+        encoded = self.codec.encode_body(record)
+        length = bytearray()
+        _write_varint(length, len(encoded))
+        self.stream.write(bytes(length))
+        self.stream.write(encoded)
+
+
+class RecordReader(object):
+    """Reads the records written by a RecordWriter back from a binary stream"""
+
+    def __init__(self, stream, codec):
+        self.stream = stream
+        self.codec = codec
+        self.codec.check_header(stream.read(len(codec.header)))
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        length = 0
+        shift = 0
+        while True:
+            byte = self.stream.read(1)
+            if not byte:
+                if shift:
+                    raise ValueError("Encoded record stream ended within a record length")
+                raise StopIteration
+            length |= (byte[0] & 0x7F) << shift
+            shift += 7
+            if not byte[0] & 0x80:
+                break
+
+        encoded = self.stream.read(length)
+        if len(encoded) != length:
+            raise ValueError("Encoded record stream ended within a record")
+        return self.codec.decode_body(encoded)
+
+
+def _table(schema, fields, path=()):
+    names = [] if path else ["__metadata__"]
+    children = {}
+    enums = {}
+    for field, validators in fields.items():
+        field = _read_construct(field)
+        if field.name == "**":
+            continue
+
+        index = len(names)
+        names.append(field.name)
+        if type(validators) == dict:
+            children[index] = _table(schema, validators, path + (field.name,))
+            continue
+
+        for validator in [validators] if type(validators) == str else validators or ():
+            validator = _read_validator(schema, validator)
+            if validator.construct.name == "one_of" and not validator.construct.mutate:
+                values = tuple(str(value) for value in validator.args)
+                enums[index] = (values, _indexes(values))
+
+    return table(tuple(names), _indexes(names), children, enums)
+
+
+def _field_paths(fields, path=()):
+    for field, validators in fields.items():
+        field_path = path + (_read_construct(field).name,)
+        if type(validators) == dict:
+            yield from _field_paths(validators, field_path)
+        else:
+            yield ".".join(field_path)
+
+
+def _indexes(values):
+    return {value: index for index, value in enumerate(values)}
+
+
+def _write_varint(output, value):
+    while value > 0x7F:
+        output.append((value & 0x7F) | 0x80)
+        value >>= 7
+    output.append(value)
+
+
+def _read_varint(buffer, position):
+    value = 0
+    shift = 0
+    while True:
+        byte = buffer[position]
+        position += 1
+        value |= (byte & 0x7F) << shift
+        shift += 7
+        if not byte & 0x80:
+            return value, position
+
+
+def _encode_record(output, record, record_table):
+    present = 0
+    extra = []
+    for key in record:
+        index = record_table.indexes.get(key, None)
+        if index is None:
+            extra.append(key)
+        else:
+            present |= 1 << index
+
+    _write_varint(output, present)
+    for index, name in enumerate(record_table.names):
+        if present & (1 << index):
+            _encode_value(
+                output,
+                record[name],
+                record_table.children.get(index, None),
+                record_table.enums.get(index, None),
+            )
+
+    _write_varint(output, len(extra))
+    for key in extra:
+        _encode_string(output, str(key))
+        _encode_value(output, record[key])
+
+
+def _encode_string(output, value):
+    encoded = value.encode("utf8")
+    _write_varint(output, len(encoded))
+    output.extend(encoded)
+
+
+def _encode_value(output, value, value_table=None, enum=None):
+    value_type = type(value)
+    if value is None:
+        output.append(NONE)
+    elif value_type == bool:
+        output.append(TRUE if value else FALSE)
+    elif value_type == int:
+        output.append(INT)
+        _write_varint(output, value * 2 if value >= 0 else -value * 2 - 1)
+    elif value_type == float:
+        output.append(FLOAT)
+        output.extend(_double.pack(value))
+    elif value_type in (list, tuple):
+        output.append(LIST)
+        _write_varint(output, len(value))
+        for item in value:
+            _encode_value(output, item, value_table, enum)
+    elif value_type == dict:
+        if value_table is not None:
+            output.append(RECORD)
+            _encode_record(output, value, value_table)
+        else:
+            output.append(MAP)
+            _write_varint(output, len(value))
+            for key, item in value.items():
+                _encode_string(output, str(key))
+                _encode_value(output, item)
+    elif enum and value in enum[1]:
+        output.append(ENUM)
+        _write_varint(output, enum[1][value])
+    else:
+        output.append(STRING)
+        _encode_string(output, str(value))
+
+
+def _decode_record(buffer, position, record_table):
+    present, position = _read_varint(buffer, position)
+    record = {}
+    for index, name in enumerate(record_table.names):
+        if present & (1 << index):
+            record[name], position = _decode_value(
+                buffer,
+                position,
+                record_table.children.get(index, None),
+                record_table.enums.get(index, None),
+            )
+
+    extra, position = _read_varint(buffer, position)
+    for _ in range(extra):
+        key, position = _decode_string(buffer, position)
+        record[key], position = _decode_value(buffer, position)
+
+    return record, position
+
+
+def _decode_string(buffer, position):
+    length, position = _read_varint(buffer, position)
+    end = position + length
+    if end > len(buffer):
+        raise IndexError("Encoded string runs past the end of the buffer")
+    return str(buffer[position:end], "utf8"), end
+
+
+def _decode_value(buffer, position, value_table=None, enum=None):
+    kind = buffer[position]
+    position += 1
+    if kind == NONE:
+        return None, position
+    elif kind == FALSE:
+        return False, position
+    elif kind == TRUE:
+        return True, position
+    elif kind == INT:
+        value, position = _read_varint(buffer, position)
+        return (value >> 1) if not value & 1 else -((value + 1) >> 1), position
+    elif kind == FLOAT:
+        return _double.unpack_from(buffer, position)[0], position + 8
+    elif kind == STRING:
+        return _decode_string(buffer, position)
+    elif kind == ENUM:
+        if enum is None:
+            raise ValueError("Encoded enum value at position {} has no enum".format(position - 1))
+        index, position = _read_varint(buffer, position)
+        return enum[0][index], position
+    elif kind == LIST:
+        length, position = _read_varint(buffer, position)
+        values = []
+        for _ in range(length):
+            value, position = _decode_value(buffer, position, value_table, enum)
+            values.append(value)
+        return values, position
+    elif kind == RECORD:
+        if value_table is None:
+            raise ValueError(
+                "Encoded record at position {} has no nested fields".format(position - 1)
+            )
+        return _decode_record(buffer, position, value_table)
+    elif kind == MAP:
+        length, position = _read_varint(buffer, position)
+        values = {}
+        for _ in range(length):
+            key, position = _decode_string(buffer, position)
+            values[key], position = _decode_value(buffer, position)
+        return values, position
+
+    raise ValueError("Unknown encoded value type {} at position {}".format(kind, position - 1))
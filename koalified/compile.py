@@ -1,37 +1,99 @@
-import copy
+import warnings
 from collections import namedtuple
+from functools import lru_cache
 
-try:
-    import Cython
-except ImportError:
-    Cython = False
+import xxhash
+from koalified import instrument, native
 
 construct = namedtuple(
     "Construct", ["name", "compute_quality", "weight", "required", "multiple", "mutate"]
 )
 validator = namedtuple("Validator", ["construct", "args", "kwargs"])
+sinks = namedtuple("Sinks", ["terms", "field_scores", "reasons"])
+SINKS = sinks(None, "field_scores", "reasons")
 INDENT = " " * 4
+REJECT_TOLERANCE = 1e-9
 
 
 def to_python(schema):
-    _ = copy.deepcopy(schema.definition)
-    _ = schema.definition.pop("__metadata__", {})
-    code = _compile_schema(schema)
-    if Cython and hasattr(Cython, "inline"):
-        name_space = schema.supported_types.copy()
-        name_space["metadata"] = schema.metadata
-        name_space = Cython.inline(code, globals=name_space, language_level=3)
-    else:
-        name_space = schema.supported_types.copy()
-        name_space["metadata"] = schema.metadata
+    with instrument.hooks.span("koalified.compile", schema_version=schema.version):
+        code, bindings = to_code(schema)
+
+        # instrumented code is short lived, so it is never worth compiling natively
+        if schema.native and not schema.profiler:
+            if not native.cythonize:
+                warnings.warn("Cython is not installed, so schemas are not compiled natively")
+            else:
+                try:
+                    return native.load(code, schema.version).build(**bindings)
+                except Exception as error:
+                    warnings.warn(
+                        "Compiling schema {} natively failed, using Python instead: {}".format(
+                            schema.version, error
+                        )
+                    )
+
+        name_space = {}
         exec(compile(code, "<string>", "exec"), name_space)
-    return name_space["apply_schema"]
+        return name_space["build"](**bindings)
+
+
+def to_code(schema):
+    """Returns the generated code of a schema and the values its build function is called with"""
+    _ = schema.definition.pop("__metadata__", {})
+    bindings = {"type_" + name: function for name, function in resolve_types(schema).items()}
+    bindings.update(_prepared_arguments(schema))
+    bindings["metadata"] = schema.metadata
+    bindings["__profile__"] = schema.profiler
+    bindings["__cache__"] = schema.cache
+    return _compile_module(schema, sorted(bindings)), bindings
+
+
+def resolve_types(schema):
+    """Returns the validator of each type the schema uses, raising a ValueError for unknown types"""
+    names = {_parse_validator(string)[0].name for string in _validators(schema.definition)}
+    return {name: schema.supported_types.resolve(name) for name in sorted(names)}
+
+
+def _validators(fields):
+    for validators in fields.values():
+        if type(validators) == dict:
+            yield from _validators(validators)
+        elif validators:
+            yield from [validators] if type(validators) == str else validators
+
+
+def _prepared_arguments(schema):
+    """Returns the arguments of validators whose types prepare them once, by their binding name"""
+    prepared = {}
+    for string in _validators(schema.definition):
+        validator = _read_validator(schema, string)
+        prepare = schema.supported_types.info(validator.construct.name).prepare
+        if prepare:
+            prepared[_prepared_name(validator)] = tuple(prepare(*validator.args))
+    return prepared
+
+
+def _prepared_name(validator):
+    arguments = repr((validator.construct.name, validator.args)).encode("utf8")
+    return "prepared_{:x}".format(xxhash.xxh64(arguments).intdigest())
+
+
+def _compile_module(schema, bindings):
+    """Wraps the schema in a build function, so each compiled schema binds its own types"""
+    code = ["def build({}):".format(", ".join(bindings))]
+    if schema.cache is not None:
+        code.extend(_indent(_compile_item_functions(schema, schema.definition)))
+    code.extend(_indent(_compile_schema(schema).split("\n")))
+    code.append("    return apply_schema")
+    return "\n".join(code)
 
 
 def _indent(code):
     return [INDENT + statement for statement in code]
 
 
+@lru_cache(maxsize=4096)
 def _read_construct(line):
     if "~" in line:
         split_line = line.split("~", -1)
@@ -108,147 +170,510 @@ def _compile_schema(schema):
         code.append('    full_output["__metadata__"]["explain_scores"] = reasons')
 
     code.extend(_indent(_compile_fields(schema, schema.definition)))
-    if not schema.fail_fast:
-        code.append("    if errors:")
+    code.extend(_indent(_raise_errors(schema)))
+    score = "score / possible_score"
+    if schema.projected:
+        # a projection may only cover fields that add nothing to the possible score
+        score = "(score / possible_score if possible_score else None)"
+    if schema.min_score is not None:
         code.append(
-            '        raise ValueError("Errors occurred when applying the schema: {}".format(",".join(errors)))'
+            "    if possible_score and score / possible_score < {}:".format(schema.min_score)
         )
-    code.append('    full_output["__metadata__"]["score"] = score / possible_score')
+        code.extend(_indent(_indent(_reject("score / possible_score"))))
+    code.append('    full_output["__metadata__"]["score"] = {}'.format(score))
     code.append("    return full_output")
     return "\n".join(code)
 
 
-def _compile_fields(schema, fields, counter=1, path=()):
-    code = []
-    field_names = []
-    include_extra = False
-    include_extra_validators = None
-    for field, validators in fields.items():
-        field = _read_construct(field)
-        field_names.append(field.name)
+def _raise_errors(schema):
+    if schema.fail_fast:
+        return []
+
+    return [
+        "if errors:",
+        '    raise ValueError("Errors occurred when applying the schema: {}".format(",".join(errors)))',
+    ]
+
+
+def _reject(score):
+    return ['return {{"__metadata__": dict(metadata, score={}, rejected=True)}}'.format(score)]
+
+
+def _field_weight(field, validators):
+    """Returns the total weight a field adds to the possible score, or None if it depends on the input"""
+    if type(validators) != dict:
+        return field.weight
+    elif field.multiple:
+        return None
+
+    weight = 0
+    for nested_field, nested_validators in validators.items():
+        nested_weight = _field_weight(_read_construct(nested_field), nested_validators)
+        if nested_weight is None:
+            return None
+        weight += nested_weight
+
+    return weight
+
+
+def _score_paths(fields, path=()):
+    """Yields the weight and path of each scored field, in the order scores are summed.
+
+    This is declaration order with `**` last at each level.
+    """
+    extra = None
+    for key, validators in fields.items():
+        field = _read_construct(key)
         if field.name == "**":
-            include_extra = field
-            include_extra_validators = [validators] if type(validators) == str else validators
+            extra = field
         elif type(validators) == dict:
-            if field.multiple:
-                _start(code, counter)
-                code.append('output["{}"] = []'.format(field.name))
-                code.append('input_list = input["{0}"]'.format(field.name))
-                code.append("if type(input_list) == tuple:")
-                code.append("    input_list = list(input_list)")
-                code.append("elif type(input_list) is not list:")
-                code.append("    input_list = [input_list]")
-                code.append('output_list = output["{}"]'.format(field.name))
-                code.append("for input in input_list:".format(field.name))
-                code.append("    output = {}")
-                code.extend(
-                    _indent(_compile_fields(schema, validators, counter + 1, path + (field.name,)))
-                )
-                code.append("    if output:")
-                code.append("        output_list.append(output)")
-                if field.required:
-                    code.append("if not output_list:")
-                    if schema.fail_fast:
-                        code.append(
-                            '    raise ValueError("At least one {} is required")'.format(field.name)
-                        )
-                    else:
-                        code.append(
-                            '    errors.append("At least one {} is required")'.format(field.name)
-                        )
-                _end(code, counter)
-            else:
-                _start(code, counter)
-                code.append('input = input["{0}"]'.format(field.name))
-                code.append('output["{}"] = {}'.format(field.name, "{}"))
-                code.append('output = output["{}"]'.format(field.name))
-                code.extend(_compile_fields(schema, validators, counter + 1, path + (field.name,)))
-                _end(code, counter)
+            yield from _score_paths(validators, path + (field.name,))
         else:
-            code.extend(_compile_field(schema, field, validators, path=path))
-    if include_extra:
-        if include_extra.required or include_extra.multiple:
-            raise ValueError(
-                "It is currently not supported to add any rules to the inclusion of extra fields"
+            yield field.weight, ".".join(path + (field.name,))
+    if extra:
+        yield extra.weight, ".".join(path + (extra.name,))
+
+
+def _hoisted_fields(schema, fields):
+    """Returns the top-level scalar fields to validate before all others, in order.
+
+    Hoisted fields keep their value, score and explanations in locals and write them back in
+    declaration order, so the output is identical to validating in declaration order.
+    """
+    scalar = [
+        field.name
+        for field, validators in fields
+        if type(validators) != dict and field.name != "**"
+    ]
+    hoisted = []
+    if schema.required_first:
+        hoisted.extend(field.name for field, _ in fields if field.required and field.name in scalar)
+    if schema.ordering and schema.fail_fast and not schema.explain:
+        hoisted.extend(
+            name
+            for name in schema.ordering.get("fields", ())
+            if name in scalar and name not in hoisted
+        )
+    return hoisted
+
+
+def _weight_order(item):
+    weight = _field_weight(*item)
+    return float("-inf") if weight is None else -weight
+
+
+def _compile_early_reject(schema, remaining_weight, required):
+    """Returns the code rejecting a record that can no longer reach `min_score`.
+
+    The required top-level fields still to be validated are checked first, so a record missing
+    them raises as it would without `min_score`. Records within rounding of `min_score` are left
+    to the exact check once all fields are validated.
+    """
+    if remaining_weight is None:
+        return []
+
+    code = [
+        "if score + {0} < {1!r} * (possible_score + {0}):".format(
+            remaining_weight, schema.min_score - REJECT_TOLERANCE
+        )
+    ]
+    if required:
+        code.append("    for name in {!r}:".format(tuple(required)))
+        code.append("        if not input.get(name, None):")
+        if schema.fail_fast:
+            if schema.profiler:
+                code.append("            __profile__.missing(name)")
+            code.append('            raise ValueError(name + "  required but not specified")')
+        else:
+            code.append(
+                '            errors.append(ValueError(name + "  required but not specified"))'
+            )
+    code.extend(_indent(_raise_errors(schema)))
+    code.extend(_indent(_reject("(score + {0}) / (possible_score + {0})".format(remaining_weight))))
+    return code
+
+
+def _remaining_weights(fields):
+    remaining = [0] * len(fields)
+    total = 0
+    for index in range(len(fields) - 1, -1, -1):
+        remaining[index] = total
+        if total is not None:
+            weight = _field_weight(*fields[index])
+            total = None if weight is None else total + weight
+
+    return remaining
+
+
+def _compile_fields(schema, fields, counter=1, path=(), sinks=SINKS):
+    fields = [(_read_construct(field), validators) for field, validators in fields.items()]
+    field_names = [field.name for field, _ in fields]
+    extra = [(field, validators) for field, validators in fields if field.name == "**"]
+    fields = [(field, validators) for field, validators in fields if field.name != "**"]
+    if not path and schema.min_score is not None:
+        code = _compile_by_weight(schema, fields, counter, extra[-1][0].weight if extra else 0)
+    else:
+        code = _compile_in_order(schema, fields, counter, path, sinks)
+    if extra:
+        code.extend(_compile_extra(schema, *extra[-1], field_names, path, sinks))
+
+    return code
+
+
+def _compile_in_order(schema, fields, counter, path, sinks):
+    code = []
+    hoisted = {}
+    if not path:
+        by_name = {field.name: (field, validators) for field, validators in fields}
+        for index, name in enumerate(_hoisted_fields(schema, fields)):
+            validate_code, score_code, write_code = _compile_field(
+                schema, *by_name[name], path=path, index=index
+            )
+            code.extend(validate_code)
+            hoisted[name] = write_code + score_code
+
+    for field, validators in fields:
+        if field.name in hoisted:
+            code.extend(hoisted[field.name])
+        elif type(validators) == dict:
+            target = 'output["{}"]'.format(field.name)
+            code.extend(_compile_group(schema, field, validators, counter, path, target, sinks))
+        else:
+            code.extend(_compile_field(schema, field, validators, path=path, sinks=sinks))
+
+    return code
+
+
+def _compile_by_weight(schema, fields, counter, extra_weight):
+    """Returns the code validating top-level fields heaviest first, for early rejection.
+
+    Every field keeps its results in locals. Unless the record is rejected early, they are
+    written back and the score is summed again in declaration order, so the output and score
+    are identical to validating in declaration order.
+    """
+    order = sorted(range(len(fields)), key=lambda index: _weight_order(fields[index]))
+    if schema.required_first:
+        order.sort(key=lambda index: not fields[index][0].required)
+    remaining_weights = [
+        None if weight is None else weight + extra_weight
+        for weight in _remaining_weights([fields[index] for index in order])
+    ]
+
+    code = []
+    deferred = {}
+    for position, index in enumerate(order):
+        field, validators = fields[index]
+        if type(validators) == dict:
+            validate_code, score_code, write_code = _compile_deferred_group(
+                schema, field, validators, counter, index
+            )
+        else:
+            validate_code, score_code, write_code = _compile_field(
+                schema, field, validators, path=(), index=index
+            )
+        code.extend(validate_code + score_code)
+        deferred[index] = write_code + score_code
+        required = [
+            fields[later][0].name
+            for later in order[position + 1 :]
+            if fields[later][0].required and type(fields[later][1]) != dict
+        ]
+        code.extend(_compile_early_reject(schema, remaining_weights[position], required))
+
+    code.extend(["score = 0", "possible_score = 0"])
+    for index in range(len(fields)):
+        code.extend(deferred[index])
+    return code
+
+
+def _compile_deferred_group(schema, field, validators, counter, index):
+    """Returns the code validating nested fields into locals, like `_compile_field` with an index"""
+    target = "field_value_{}".format(index)
+    group_sinks = SINKS._replace(terms="field_terms_{}".format(index))
+    code = ["{} = []".format(group_sinks.terms)]
+    write_code = ['output["{}"] = {}'.format(field.name, target)]
+    if schema.score_fields:
+        group_sinks = group_sinks._replace(field_scores="field_scores_{}".format(index))
+        code.append("{} = {{}}".format(group_sinks.field_scores))
+        write_code.append("field_scores.update({})".format(group_sinks.field_scores))
+    if schema.explain:
+        group_sinks = group_sinks._replace(reasons="field_reasons_{}".format(index))
+        code.append("{} = []".format(group_sinks.reasons))
+        write_code.append("reasons.extend({})".format(group_sinks.reasons))
+
+    code.extend(_compile_group(schema, field, validators, counter, (), target, group_sinks))
+    return code, _add_terms(group_sinks.terms), write_code
+
+
+def _compile_group(schema, field, validators, counter, path, target, sinks):
+    code = []
+    _start(code, counter)
+    if field.multiple:
+        code.append("{} = []".format(target))
+        code.append('input_list = input["{0}"]'.format(field.name))
+        code.append("if type(input_list) == tuple:")
+        code.append("    input_list = list(input_list)")
+        code.append("elif type(input_list) is not list:")
+        code.append("    input_list = [input_list]")
+        # suffixed, so the list of a nested field that allows multiple values does not replace it
+        code.append("output_list{} = {}".format(counter, target))
+        code.append("for input in input_list:")
+        if schema.cache is not None:
+            code.extend(_indent(_compile_cached_item(schema, path + (field.name,), sinks)))
+        else:
+            code.append("    output = {}")
+            code.extend(
+                _indent(
+                    _compile_fields(schema, validators, counter + 1, path + (field.name,), sinks)
+                )
             )
-        code.append("possible_validator_score = 1")
-        code.append("validator_score = 1")
+        code.append("    if output:")
+        code.append("        output_list{}.append(output)".format(counter))
+        if field.required:
+            code.append("if not output_list{}:".format(counter))
+            if schema.fail_fast:
+                code.append(
+                    '    raise ValueError("At least one {} is required")'.format(field.name)
+                )
+            else:
+                code.append('    errors.append("At least one {} is required")'.format(field.name))
+    else:
+        code.append('input = input["{0}"]'.format(field.name))
+        code.append("{} = {{}}".format(target))
+        code.append("output = {}".format(target))
+        code.extend(_compile_fields(schema, validators, counter + 1, path + (field.name,), sinks))
+    _end(code, counter)
+    return code
+
+
+def _compile_item_functions(schema, fields, path=()):
+    """Returns a function per nested field that allows multiple values, validating one item.
+
+    Each function returns the item's output along with the score terms, field scores,
+    explanations and errors it adds, so the items of a cached schema can be cached as well.
+    """
+    code = []
+    for key, validators in fields.items():
+        field = _read_construct(key)
+        if type(validators) != dict:
+            continue
+        field_path = path + (field.name,)
+        if field.multiple:
+            item_sinks = sinks("item_terms", "item_scores", "item_reasons")
+            code.append("def {}(input):".format(_item_function_name(field_path)))
+            code.append("    output = {}")
+            code.append("    item_terms = []")
+            results = ["output", "item_terms", "None", "None", "None"]
+            if schema.score_fields:
+                code.append("    item_scores = {}")
+                results[2] = "item_scores"
+            if schema.explain:
+                code.append("    item_reasons = []")
+                results[3] = "item_reasons"
+            if not schema.fail_fast:
+                code.append("    errors = []")
+                results[4] = "errors"
+            code.extend(_indent(_compile_fields(schema, validators, 1, field_path, item_sinks)))
+            code.append("    return [{}]".format(", ".join(results)))
+        code.extend(_compile_item_functions(schema, validators, field_path))
+    return code
+
+
+def _item_function_name(field_path):
+    return "apply_item_{:x}".format(xxhash.xxh64(repr(field_path).encode("utf8")).intdigest())
+
+
+def _compile_cached_item(schema, field_path, sinks):
+    """Returns the code validating an item through the cache and adding what it returns"""
+    code = [
+        "output, group_terms, group_scores, group_reasons, group_errors = __cache__.apply("
+        "{}, input, {!r})".format(_item_function_name(field_path), ".".join(field_path))
+    ]
+    if sinks.terms:
+        code.append("{}.extend(group_terms)".format(sinks.terms))
+    else:
+        code.extend(_add_terms("group_terms"))
+    if schema.score_fields:
+        code.append("{}.update(group_scores)".format(sinks.field_scores))
+    if schema.explain:
+        code.append("{}.extend(group_reasons)".format(sinks.reasons))
+    if not schema.fail_fast:
+        code.append("errors.extend(group_errors)")
+    return code
+
+
+def _compile_extra(schema, field, validators, field_names, path, sinks):
+    """Returns the code validating the extra fields matched by `**`"""
+    if field.required or field.multiple:
+        raise ValueError(
+            "It is currently not supported to add any rules to the inclusion of extra fields"
+        )
+    validators = [validators] if type(validators) == str else validators
+
+    code = []
+    # a set literal of constants used with `in` is compiled into a frozenset constant
+    known_fields = "{{{}}}".format(", ".join(repr(name) for name in field_names))
+    extra_path = ".".join(path + (field.name,))
+    if schema.passthrough_extra or not validators:
         code.append(
-            "for field, value in  [(field, value) for (field, value) in "
-            "input.items() if field not in {}]:".format(repr(field_names))
+            "output.update({{field: value for field, value in input.items() "
+            "if value is not None and field not in {}}})".format(known_fields)
         )
-        code.append("    output_value = value")
-        code.extend(_indent(_compile_validators(schema, field, include_extra_validators, path)))
-        code.append("    if output_value is not None:")
-        code.append("        output[field] = output_value")
+        if schema.score_fields:
+            code.append('{}["{}"] = 1.0'.format(sinks.field_scores, extra_path))
+        code.extend(_add_score(field.weight, "1.0", sinks.terms))
+        return code
+
+    code.append("possible_validator_score = 1")
+    code.append("validator_score = 1")
+    code.append("for field, value in input.items():")
+    code.append("    if field in {}:".format(known_fields))
+    code.append("        continue")
+    code.append("    output_value = value")
+    code.extend(
+        _indent(_compile_validators(schema, field, validators, extra_path, reasons=sinks.reasons))
+    )
+    code.append("    if output_value is not None:")
+    code.append("        output[field] = output_value")
+    if schema.score_fields:
         code.append(
-            "score += {} * (validator_score / possible_validator_score)".format(
-                include_extra.weight
+            '{}["{}"] = validator_score / possible_validator_score'.format(
+                sinks.field_scores, extra_path
             )
         )
-        code.append("possible_score += {}".format(include_extra.weight))
-
+    code.extend(
+        _add_score(field.weight, "(validator_score / possible_validator_score)", sinks.terms)
+    )
     return code
 
 
-def _compile_field(schema, field, validators, path):
+def _add_score(weight, ratio, terms=None):
+    """Returns the code adding a weighted ratio to the score, or to a list of terms added later"""
+    if terms:
+        return ["{}.append(({}, {}))".format(terms, weight, ratio)]
+    return ["score += {} * {}".format(weight, ratio), "possible_score += {}".format(weight)]
+
+
+def _add_terms(terms):
+    return [
+        "for term_weight, term_ratio in {}:".format(terms),
+        "    score += term_weight * term_ratio",
+        "    possible_score += term_weight",
+    ]
+
+
+def _compile_field(schema, field, validators, path, index=None, sinks=SINKS):
+    """Returns the code validating a single field.
+
+    If an index is given, the field's value, score and explanations are kept in locals named
+    after it, and the code adding its score and the code writing the rest to the output are
+    returned separately.
+    """
     field_path = ".".join(path + (field.name,))
     validators = [validators] if type(validators) == str else validators
-
-    exists_code = ['if not input.get("{}", None):'.format(field.name)]
+    target = 'output["{}"]'.format(field.name)
+    code = []
+    if index is not None:
+        target = "field_value_{}".format(index)
+        ratio = "field_ratio_{}".format(index)
+        code.append("{} = {} = None".format(target, ratio))
+        if schema.explain:
+            sinks = sinks._replace(reasons="field_reasons_{}".format(index))
+            code.append("{} = []".format(sinks.reasons))
+
+    code.append('if not input.get("{}", None):'.format(field.name))
     if field.required:
         if schema.fail_fast:
-            exists_code.append(
-                '    raise ValueError("{}  required but not specified")'.format(field.name)
-            )
+            if schema.profiler:
+                code.append("    __profile__.missing({})".format(repr(field_path)))
+            code.append('    raise ValueError("{}  required but not specified")'.format(field.name))
         else:
-            exists_code.append(
+            code.append(
                 '    errors.append(ValueError("{}  required but not specified"))'.format(field.name)
             )
     else:
-        exists_code.append("    possible_score += {}".format(field.weight))
-        if schema.score_fields:
-            exists_code.append('    field_scores["{}"] = 0'.format(field_path))
+        if index is not None:
+            code.append("    {} = 0".format(ratio))
+        else:
+            if sinks.terms:
+                code.append("    {}.append(({}, 0))".format(sinks.terms, field.weight))
+            else:
+                code.append("    possible_score += {}".format(field.weight))
+            if schema.score_fields:
+                code.append('    {}["{}"] = 0'.format(sinks.field_scores, field_path))
         if field.weight and schema.explain:
-            exists_code.append(
-                '    reasons.append("Value for {} was not given.")'.format(field_path)
+            code.append(
+                '    {}.append("Value for {} was not given.")'.format(sinks.reasons, field_path)
             )
-    exists_code.extend(["else:", '    output["{0}"] = input["{0}"]'.format(field.name)])
+    code.extend(["else:", '    {} = input["{}"]'.format(target, field.name)])
+    if validators:
+        code.extend(
+            _indent(_compile_validated(schema, field, validators, field_path, target, sinks, index))
+        )
 
-    if not validators:
-        return exists_code
+    if index is None:
+        return code
+
+    score_code = [
+        "if {} is not None:".format(ratio),
+        "    score += {} * {}".format(field.weight, ratio),
+        "    possible_score += {}".format(field.weight),
+    ]
+    write_code = [
+        "if {} is not None:".format(target),
+        '    output["{}"] = {}'.format(field.name, target),
+    ]
+    if schema.score_fields:
+        write_code.append("if {} is not None:".format(ratio))
+        write_code.append('    field_scores["{}"] = {}'.format(field_path, ratio))
+    if schema.explain:
+        write_code.append("reasons.extend({})".format(sinks.reasons))
+    return code, score_code, write_code
 
-    code = ["possible_validator_score = 1", "validator_score = 1"]
 
+def _compile_validated(schema, field, validators, field_path, target, sinks, index):
+    """Returns the code running the validators of a given field and adding up its score"""
+    code = ["possible_validator_score = 1", "validator_score = 1"]
     if field.multiple:
-        code.append('if type(output["{0}"]) == tuple:'.format(field.name))
-        code.append('    output["{0}"] = list(output["{0}"])'.format(field.name))
-        code.append('elif type(output["{0}"]) is not list:'.format(field.name))
-        code.append('    output["{0}"] = [output["{0}"]]'.format(field.name))
-        code.append('for index, output_value in enumerate(output["{0}"]):'.format(field.name))
-        code.extend(_indent(_compile_validators(schema, field, validators, field_path)))
-        code.append('if None in output["{0}"]:'.format(field.name))
-        code.append(
-            '    output["{0}"] = [value for value in output["{0}"] if value is not None]'.format(
-                field.name
+        code.append("if type({0}) == tuple:".format(target))
+        code.append("    {0} = list({0})".format(target))
+        code.append("elif type({0}) is not list:".format(target))
+        code.append("    {0} = [{0}]".format(target))
+        code.append("for index, output_value in enumerate({}):".format(target))
+        code.extend(
+            _indent(
+                _compile_validators(schema, field, validators, field_path, target, sinks.reasons)
             )
         )
+        code.append("if None in {}:".format(target))
+        code.append("    {0} = [value for value in {0} if value is not None]".format(target))
     else:
-        code.append('output_value = output["{0}"]'.format(field.name))
-        code.extend(_compile_validators(schema, field, validators, field_path))
-        code.append("if output_value is not None:")
-        code.append('    output["{0}"] = output_value'.format(field.name))
-        code.append("else:")
-        code.append('    output.pop("{0}")'.format(field.name))
+        code.append("output_value = {}".format(target))
+        code.extend(
+            _compile_validators(schema, field, validators, field_path, target, sinks.reasons)
+        )
+        if index is not None:
+            code.append("{} = output_value".format(target))
+        else:
+            code.append("if output_value is not None:")
+            code.append("    {} = output_value".format(target))
+            code.append("else:")
+            code.append('    output.pop("{0}")'.format(field.name))
+
+    if index is not None:
+        code.append("field_ratio_{} = validator_score / possible_validator_score".format(index))
+        return code
 
     if schema.score_fields:
         code.append(
-            'field_scores["{}"] = (validator_score / possible_validator_score)'.format(field_path)
+            '{}["{}"] = (validator_score / possible_validator_score)'.format(
+                sinks.field_scores, field_path
+            )
         )
-
-    code.append("score += {} * (validator_score / possible_validator_score)".format(field.weight))
-    code.append("possible_score += {}".format(field.weight))
-    return exists_code + _indent(code)
+    code.extend(
+        _add_score(field.weight, "(validator_score / possible_validator_score)", sinks.terms)
+    )
+    return code
 
 
 def _read_value(schema, value):
@@ -265,40 +690,126 @@ def _read_value(schema, value):
     return value
 
 
-def _read_validator(schema, string):
+@lru_cache(maxsize=4096)
+def _parse_validator(string):
     parts = string.split(" ")
     kind = _read_construct(parts.pop(0))
 
     args = []
-    kwargs = {}
+    kwargs = []
     for value in parts:
         if "=" in value:
-            key, value = value.split("=")
-            value = _read_value(schema, value)
+            kwargs.append(tuple(value.split("=")))
+        else:
+            args.append(value)
 
-            if key in kwargs:
-                if kwargs[key] != list:
-                    kwargs[key] = [kwargs[key]]
-                kwargs[key].append(value)
-            else:
-                kwargs[key] = value
+    return kind, tuple(args), tuple(kwargs)
+
+
+def _read_validator(schema, string):
+    kind, parsed_args, parsed_kwargs = _parse_validator(string)
+
+    args = [_read_value(schema, value) for value in parsed_args]
+    kwargs = {}
+    for key, value in parsed_kwargs:
+        value = _read_value(schema, value)
+
+        if key in kwargs:
+            if kwargs[key] != list:
+                kwargs[key] = [kwargs[key]]
+            kwargs[key].append(value)
         else:
-            args.append(_read_value(schema, value))
+            kwargs[key] = value
 
     return validator(kind, args, kwargs)
 
 
-def _compile_validators(schema, field, validators, field_path):
+def _validator_order(schema, field, validators, field_path):
+    """Returns the validator order for a field if applying it can not change the output.
+
+    A learned order is used when there is one, otherwise validators are ordered by the estimated
+    cost of their types if `cost_order` is set. Only validators whose failure rejects the whole
+    record may move, and never across a mutating validator or when reordering would change how
+    the validator score is summed.
+    """
+    if not schema.fail_fast:
+        return range(len(validators))
+
+    constructs = [_parse_validator(validator)[0] for validator in validators]
+    if not all(float(construct.weight).is_integer() for construct in constructs):
+        return range(len(validators))
+
+    runs = []
+    run = 0
+    for construct in constructs:
+        run += construct.mutate
+        runs.append(run)
+
+    order = schema.ordering and schema.ordering.get("validators", {}).get(field_path)
+    if not order:
+        if not schema.cost_order:
+            return range(len(validators))
+        order = _cost_order(schema, field, constructs, runs)
+    if sorted(order) != list(range(len(validators))):
+        return range(len(validators))
+
+    kept = []
+    for position, index in enumerate(order):
+        construct = constructs[index]
+        if position != index and (construct.mutate or runs[position] != runs[index]):
+            return range(len(validators))
+        if not (construct.required and field.required):
+            kept.append(index)
+    if kept != sorted(kept):
+        return range(len(validators))
+
+    return order
+
+
+def _cost_order(schema, field, constructs, runs):
+    """Orders the validators that reject the record cheapest first within each run"""
+    order = []
+    for run in sorted(set(runs)):
+        indexes = [index for index, run_index in enumerate(runs) if run_index == run]
+        leading = [index for index in indexes[:1] if constructs[index].mutate]
+        costs = {
+            index: schema.supported_types.info(constructs[index].name).cost
+            for index in indexes
+            if constructs[index].required and field.required and index not in leading
+        }
+        if None in costs.values():
+            order.extend(indexes)
+            continue
+
+        raising = sorted(costs, key=costs.get)
+        rest = [index for index in indexes if index not in leading and index not in costs]
+        order.extend(leading + raising + rest)
+    return order
+
+
+def _compile_validators(schema, field, validators, field_path, target=None, reasons="reasons"):
     code = []
-    for validator in validators:
+    for index in _validator_order(schema, field, validators, field_path):
         code.append("if output_value is not None:")
-        validator = _read_validator(schema, validator)
+        validator = _read_validator(schema, validators[index])
         if validator.construct.weight:
             code.append("    possible_validator_score += {}".format(validator.construct.weight))
         code.append("    try:")
-        call_validator = "{}(output_value, *{}, **{})".format(
-            validator.construct.name, repr(validator.args), repr(validator.kwargs)
-        )
+        args = repr(validator.args)
+        if schema.supported_types.info(validator.construct.name).prepare:
+            args = _prepared_name(validator)
+        arguments = "output_value, *{}, **{}".format(args, repr(validator.kwargs))
+        call_validator = "type_{}({})".format(validator.construct.name, arguments)
+        if schema.profiler:
+            site = schema.profiler.register(
+                field_path,
+                index,
+                validator.construct.mutate,
+                validator.construct.required and field.required and schema.fail_fast,
+            )
+            call_validator = "__profile__({}, type_{}, {})".format(
+                repr(site), validator.construct.name, arguments
+            )
         if validator.construct.mutate:
             code.append("        output_value = {}".format(call_validator))
         else:
@@ -316,9 +827,10 @@ def _compile_validators(schema, field, validators, field_path):
                 code.append("        output_value = None")
                 if schema.explain:
                     code.append(
-                        '        reasons.append("Provided value "'
+                        '        {}.append("Provided value "'
                         '                       " for {} field did not match required validator {} {} {}"'
                         "                      )".format(
+                            reasons,
                             field_path,
                             validator.construct.name,
                             " ".join(validator.args),
@@ -329,9 +841,10 @@ def _compile_validators(schema, field, validators, field_path):
         else:
             if schema.explain:
                 code.append(
-                    '        reasons.append("Provided value of " + str(output_value) +'
+                    '        {}.append("Provided value of " + str(output_value) +'
                     '                       " for {} field did not match {} {} {}"'
                     "                      )".format(
+                        reasons,
                         field_path,
                         validator.construct.name,
                         " ".join(validator.args),
@@ -341,6 +854,6 @@ def _compile_validators(schema, field, validators, field_path):
             else:
                 code.append("        pass")
     if field.multiple:
-        code.append('output["{0}"][index] = output_value'.format(field.name))
+        code.append("{}[index] = output_value".format(target))
 
     return code
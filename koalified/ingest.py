@@ -0,0 +1,52 @@
+"""Decodes and encodes JSON records, using orjson when it is installed"""
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = False
+
+
+def loads(buffer):
+    """Decodes a JSON document from bytes, bytearray, memoryview, mmap or str"""
+    if orjson:
+        if type(buffer) not in (bytes, bytearray, memoryview, str):
+            buffer = memoryview(buffer)
+        return orjson.loads(buffer)
+    elif type(buffer) not in (bytes, bytearray, str):
+        buffer = bytes(buffer)
+    return json.loads(buffer)
+
+
+def dumps(value):
+    """Encodes a validated record as JSON bytes, representing any non JSON values as strings"""
+    if orjson:
+        return orjson.dumps(value, default=str)
+    return json.dumps(value, default=str, separators=(",", ":")).encode("utf8")
+
+
+def lines(buffer, start=0, end=None):
+    """Yields each non-empty line of a newline delimited buffer as a memoryview, without copying"""
+    view = memoryview(buffer)
+    for line_start, line_end in line_spans(buffer, start, end):
+        yield view[line_start:line_end]
+
+
+def line_spans(buffer, start=0, end=None):
+    """Yields the start and end offset of each non-empty line in a newline delimited buffer"""
+    view = memoryview(buffer)
+    if hasattr(buffer, "find"):
+        searchable = buffer
+    elif hasattr(view.obj, "find") and view.nbytes == len(view.obj):
+        searchable = view.obj
+    else:
+        searchable = view.tobytes()
+
+    end = view.nbytes if end is None else end
+    while start < end:
+        line_end = searchable.find(b"\n", start, end)
+        if line_end == -1:
+            line_end = end
+        if line_end > start:
+            yield start, line_end
+        start = line_end + 1
@@ -0,0 +1,131 @@
+"""Pluggable hooks that time schema lifecycle steps and count validation outcomes.
+
+Koalified reports to `hooks`, which does nothing by default. Spans time loading definitions
+(`koalified.load_definition`), fetching remote imports (`koalified.import`), compiling
+(`koalified.compile`) and batch validation (`koalified.validate_file`,
+`koalified.validate_frame`). Batch validation also counts `koalified.records`,
+`koalified.rejected` and `koalified.errors` and observes each `koalified.score`.
+"""
+from time import perf_counter
+
+try:
+    from opentelemetry import metrics, trace
+except ImportError:
+    metrics = trace = None
+
+
+class _NoSpan(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+class Hooks(object):
+    """Hooks that ignore everything, subclassed to send spans and metrics elsewhere"""
+
+    enabled = False
+
+    def span(self, name, **attributes):
+        """Returns a context manager timing the code run within it"""
+        return _NO_SPAN
+
+    def count(self, name, value=1, **attributes):
+        pass
+
+    def observe(self, name, value, count=1, **attributes):
+        """Records `count` observations of a value, such as a score, for a histogram"""
+        pass
+
+
+class _Span(object):
+    def __init__(self, recorder, name, attributes):
+        self.recorder = recorder
+        self.name = name
+        self.attributes = attributes
+
+    def __enter__(self):
+        self.start = perf_counter()
+        return self
+
+    def __exit__(self, *exception):
+        self.recorder.spans.append((self.name, self.attributes, perf_counter() - self.start))
+        return False
+
+
+class Recorder(Hooks):
+    """Keeps all spans and metrics in memory, for tests and debugging"""
+
+    enabled = True
+
+    def __init__(self):
+        self.spans = []
+        self.counters = {}
+        self.observations = {}
+
+    def span(self, name, **attributes):
+        return _Span(self, name, attributes)
+
+    def count(self, name, value=1, **attributes):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name, value, count=1, **attributes):
+        self.observations.setdefault(name, []).extend([value] * count)
+
+    def span_names(self):
+        return [name for name, _, _ in self.spans]
+
+
+class OpenTelemetryHooks(Hooks):
+    """Reports spans to an OpenTelemetry tracer and metrics to counters and histograms"""
+
+    enabled = True
+
+    def __init__(self, tracer_provider=None, meter_provider=None):
+        if trace is None:
+            raise ImportError("OpenTelemetry hooks require the opentelemetry-api package")
+
+        self.tracer = trace.get_tracer("koalified", tracer_provider=tracer_provider)
+        self.meter = metrics.get_meter("koalified", meter_provider=meter_provider)
+        self._counters = {}
+        self._histograms = {}
+
+    def span(self, name, **attributes):
+        return self.tracer.start_as_current_span(name, attributes=_attributes(attributes))
+
+    def count(self, name, value=1, **attributes):
+        counter = self._counters.get(name, None)
+        if counter is None:
+            counter = self._counters[name] = self.meter.create_counter(name)
+        counter.add(value, _attributes(attributes))
+
+    def observe(self, name, value, count=1, **attributes):
+        histogram = self._histograms.get(name, None)
+        if histogram is None:
+            histogram = self._histograms[name] = self.meter.create_histogram(name)
+        attributes = _attributes(attributes)
+        for _ in range(count):
+            histogram.record(value, attributes)
+
+
+def _attributes(attributes):
+    """OpenTelemetry only accepts attributes with primitive values"""
+    return {
+        key: value if type(value) in (bool, int, float, str) else str(value)
+        for key, value in attributes.items()
+        if value is not None
+    }
+
+
+hooks = Hooks()
+
+
+def set_hooks(new_hooks):
+    """Sets the hooks koalified reports to, returning the previous ones"""
+    global hooks
+    previous, hooks = hooks, new_hooks or Hooks()
+    return previous
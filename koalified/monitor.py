@@ -0,0 +1,118 @@
+"""Tracks data quality by validating a sample of records instead of every record"""
+import copy
+import random
+
+
+class QualityMonitor(object):
+    """Keeps constant memory aggregates of score, per field score and error frequency.
+
+    By default each observed record is validated with the given probability (`rate`). When a
+    `reservoir` size is given instead, a uniform sample of that many records is kept and only
+    validated when a report is requested.
+    """
+
+    def __init__(self, schema, rate=0.01, reservoir=None, bins=10, max_errors=100, seed=None):
+        self.schema = copy.copy(schema)
+        self.schema.score_fields = True
+        self.schema.profiler = None
+        self.schema._compiled = False
+        self.rate = rate
+        self.reservoir = [] if reservoir else None
+        self.reservoir_size = reservoir
+        self.bins = bins
+        self.max_errors = max_errors
+        self.seen = 0
+        self._random = random.Random(seed)
+        self._aggregates = _Aggregates(bins, max_errors)
+
+    def observe(self, record):
+        """Observes a single record, validating it if it is sampled"""
+        self.seen += 1
+        if self.reservoir is not None:
+            if len(self.reservoir) < self.reservoir_size:
+                self.reservoir.append(record)
+            else:
+                index = self._random.randrange(self.seen)
+                if index < self.reservoir_size:
+                    self.reservoir[index] = record
+        elif self._random.random() < self.rate:
+            self._aggregates.add(self.schema.compiled(), record)
+
+    def observe_many(self, records):
+        for record in records:
+            self.observe(record)
+
+    def report(self):
+        """Returns the current quality aggregates"""
+        aggregates = self._aggregates
+        if self.reservoir is not None:
+            aggregates = _Aggregates(self.bins, self.max_errors)
+            apply_schema = self.schema.compiled()
+            for record in self.reservoir:
+                aggregates.add(apply_schema, record)
+
+        report = aggregates.report()
+        report["seen"] = self.seen
+        return report
+
+
+class _Aggregates(object):
+    def __init__(self, bins, max_errors):
+        self.max_errors = max_errors
+        self.sampled = 0
+        self.valid = 0
+        self.rejected = 0
+        self.score_total = 0.0
+        self.score_min = None
+        self.score_max = None
+        self.histogram = [0] * bins
+        self.field_totals = {}
+        self.field_counts = {}
+        self.errors = {}
+
+    def add(self, apply_schema, record):
+        self.sampled += 1
+        try:
+            output = apply_schema(record)
+        except Exception as error:
+            self.add_error("{}: {}".format(type(error).__name__, error))
+            return
+
+        metadata = output["__metadata__"]
+        if metadata.get("rejected", False):
+            self.rejected += 1
+            return
+
+        self.valid += 1
+        score = metadata["score"]
+        self.score_total += score
+        self.score_min = score if self.score_min is None else min(self.score_min, score)
+        self.score_max = score if self.score_max is None else max(self.score_max, score)
+        bins = len(self.histogram)
+        self.histogram[max(min(int(score * bins), bins - 1), 0)] += 1
+        for field_path, field_score in metadata["field_scores"].items():
+            self.field_totals[field_path] = self.field_totals.get(field_path, 0.0) + field_score
+            self.field_counts[field_path] = self.field_counts.get(field_path, 0) + 1
+
+    def add_error(self, error):
+        if error not in self.errors and len(self.errors) >= self.max_errors:
+            error = "other"
+        self.errors[error] = self.errors.get(error, 0) + 1
+
+    def report(self):
+        return {
+            "sampled": self.sampled,
+            "valid": self.valid,
+            "rejected": self.rejected,
+            "errors": dict(self.errors),
+            "score": {
+                "mean": self.score_total / self.valid if self.valid else None,
+                "min": self.score_min,
+                "max": self.score_max,
+                "histogram": list(self.histogram),
+            },
+            "field_scores": {
+                field_path: total / self.field_counts[field_path]
+                for field_path, total in self.field_totals.items()
+            },
+        }
@@ -0,0 +1,85 @@
+"""Compiles generated schema code into native extension modules using Cython, caching them on disk"""
+import importlib.machinery
+import importlib.util
+import os
+import shutil
+import tempfile
+
+import xxhash
+
+try:
+    from Cython.Build import cythonize
+except ImportError:
+    cythonize = False
+
+CACHE_DIRECTORY = os.environ.get(
+    "KOALIFIED_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "koalified")
+)
+_modules = {}
+_failures = {}
+
+
+def module_name(code, schema_version):
+    version = "".join(character for character in str(schema_version) if character.isalnum())
+    return "koalified_schema_{}_{}".format(version, xxhash.xxh64(code.encode("utf8")).hexdigest())
+
+
+def load(code, schema_version, cache_directory=None):
+    """Returns the native module for the given code, building it only if it is not cached yet.
+
+    A module that failed to build or load raises the same error again without another attempt,
+    for as long as the process runs.
+    """
+    name = module_name(code, schema_version)
+    if name in _modules:
+        return _modules[name]
+    if name in _failures:
+        raise _failures[name]
+
+    cache_directory = cache_directory or CACHE_DIRECTORY
+    path = os.path.join(cache_directory, name + importlib.machinery.EXTENSION_SUFFIXES[0])
+    try:
+        if not os.path.exists(path):
+            _build(name, code, cache_directory, path)
+
+        spec = importlib.util.spec_from_file_location(name, path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    except Exception as error:
+        _failures[name] = error
+        raise
+
+    _modules[name] = module
+    return module
+
+
+def _build(name, code, cache_directory, path):
+    """Builds the module in a directory of its own, then moves it into place in a single step.
+
+    Concurrent builds of the same module, such as by `validate_file` workers, each build their
+    own copy, and a module is never loaded while it is still being written.
+    """
+    from setuptools import Distribution, Extension
+    from setuptools.command.build_ext import build_ext
+
+    os.makedirs(cache_directory, exist_ok=True)
+    build_directory = tempfile.mkdtemp(prefix=name + "-", dir=cache_directory)
+    try:
+        source = os.path.join(build_directory, name + ".pyx")
+        with open(source, "w") as source_file:
+            source_file.write(code)
+
+        extensions = cythonize(
+            [Extension(name, [source])],
+            quiet=True,
+            compiler_directives={"language_level": 3},
+            build_dir=build_directory,
+        )
+        command = build_ext(Distribution({"ext_modules": extensions}))
+        command.finalize_options()
+        command.build_lib = build_directory
+        command.build_temp = os.path.join(build_directory, "build")
+        command.run()
+        os.replace(command.get_ext_fullpath(name), path)
+    finally:
+        shutil.rmtree(build_directory, ignore_errors=True)
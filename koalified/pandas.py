@@ -0,0 +1,308 @@
+"""Validates pandas DataFrames column by column instead of record by record"""
+import copy
+
+import pandas
+
+from koalified import instrument, types
+from koalified.compile import _read_construct, _read_validator, to_python
+
+
+def validate_frame(frame, schema, chunksize=None, field_scores=False):
+    """Returns a DataFrame of the normalized fields of each row, along with its `score`.
+
+    Top-level fields are validated a whole column at a time, using vectorized implementations of
+    the vectorizable built-in `str`, `int`, `float`, `one_of` and `match` types where the column
+    allows it and calling any other validator once per value. Schemas with nested fields or a `**`
+    field, and schemas set to `explain` or not to `fail_fast`, are validated row by row. When
+    `field_scores` is set, a `score_<field>` column is added per field. Rows rejected by
+    `min_score` only have their `score` and `rejected` columns set.
+    """
+    hooks = instrument.hooks
+    chunksize = chunksize or len(frame) or 1
+    with hooks.span("koalified.validate_frame", rows=len(frame), chunksize=chunksize):
+        try:
+            chunks = [
+                _validate_chunk(frame.iloc[start : start + chunksize], schema, field_scores)
+                for start in range(0, len(frame), chunksize)
+            ]
+        except Exception as error:
+            hooks.count("koalified.errors", error=type(error).__name__)
+            raise
+        result = pandas.concat(chunks) if chunks else _validate_chunk(frame, schema, field_scores)
+
+    if hooks.enabled:
+        hooks.count("koalified.records", len(result))
+        if "rejected" in result:
+            hooks.count("koalified.rejected", int(result["rejected"].fillna(False).sum()))
+        for score in result["score"]:
+            hooks.observe("koalified.score", score)
+    return result
+
+
+def _validate_chunk(frame, schema, field_scores):
+    fields = [
+        (key, _read_construct(key), validators) for key, validators in schema.definition.items()
+    ]
+    if (
+        schema.explain
+        or not schema.fail_fast
+        or any(type(validators) == dict or field.name == "**" for _, field, validators in fields)
+    ):
+        return _validate_rows(frame, schema, field_scores)
+
+    result = pandas.DataFrame(index=frame.index)
+    score = pandas.Series(0, index=frame.index, dtype=float)
+    possible_score = pandas.Series(0, index=frame.index, dtype=float)
+    for key, field, validators in fields:
+        validators = [validators] if type(validators) == str else validators or []
+        if field.name in frame:
+            column = frame[field.name].astype(object)
+        else:
+            column = pandas.Series(None, index=frame.index, dtype=object)
+
+        if field.multiple:
+            values, ratio, present = _validate_each(schema, key, field, validators, column)
+        else:
+            values, ratio, present = _validate_column(schema, field, validators, column)
+
+        result[field.name] = values
+        if validators:
+            ratio = ratio.where(present, 0.0)
+            score = score + ratio * field.weight
+            possible_score = possible_score + field.weight
+        else:
+            # like compiled schemas, given fields without validators do not count towards the score
+            ratio = pandas.Series(0.0, index=frame.index).mask(present)
+            possible_score = possible_score + (~present) * field.weight
+        if field_scores:
+            result["score_" + field.name] = ratio
+
+    if not possible_score.all():
+        # validating such a row on its own divides by zero as well
+        raise ZeroDivisionError("A row has no fields that add to the possible score")
+    result["score"] = score / possible_score
+    if schema.min_score is not None:
+        rejected = result["score"] < schema.min_score
+        for column in result.columns.drop("score"):
+            result[column] = result[column].where(~rejected, None)
+        result["rejected"] = rejected
+    return result
+
+
+def _validate_rows(frame, schema, field_scores):
+    if field_scores and not schema.score_fields:
+        schema = copy.copy(schema)
+        schema.score_fields = True
+        schema.profiler = schema.cache = None
+        schema._compiled = False
+
+    rows = []
+    for record in frame.to_dict("records"):
+        output = schema({key: value for key, value in record.items() if _given(value)})
+        metadata = output.pop("__metadata__")
+        output["score"] = metadata["score"]
+        if "explain_scores" in metadata:
+            output["explain_scores"] = metadata["explain_scores"]
+        if field_scores:
+            for field_path, field_score in metadata.get("field_scores", {}).items():
+                output["score_" + field_path] = field_score
+        if schema.min_score is not None:
+            output["rejected"] = metadata.get("rejected", False)
+        rows.append(output)
+
+    return pandas.DataFrame(rows, index=frame.index)
+
+
+def _validate_column(schema, field, validators, column):
+    present = column.map(_given).astype(bool)
+    if field.required and not present.all():
+        raise ValueError("{}  required but not specified".format(field.name))
+
+    values = column.copy()
+    alive = present.copy()
+    possible_validator_score = pandas.Series(1.0, index=column.index)
+    validator_score = pandas.Series(1.0, index=column.index)
+    for validator in validators:
+        validator = _read_validator(schema, validator)
+        construct = validator.construct
+        if not alive.any():
+            break
+
+        new_values, passed = _apply(schema, validator, values[alive])
+        passed = passed.reindex(column.index, fill_value=False) & alive
+        failed = alive & ~passed
+        if construct.weight:
+            possible_validator_score[alive] += construct.weight
+            validator_score[passed] += construct.weight
+        if construct.mutate:
+            values[passed] = new_values[passed[alive]]
+            alive &= values.map(lambda value: value is not None).astype(bool)
+        if construct.required and failed.any():
+            if field.required:
+                raise ValueError(
+                    "Provided value of {} for {} field did not match required validator {}".format(
+                        values[failed].iloc[0], field.name, construct.name
+                    )
+                )
+            alive &= ~failed
+
+    return (
+        values.where(alive, None),
+        validator_score / possible_validator_score,
+        present,
+    )
+
+
+def _validate_each(schema, key, field, validators, column):
+    """Validates a field that allows multiple values by calling a schema of only that field"""
+    field_schema = copy.copy(schema)
+    field_schema.definition = {key: validators}
+    field_schema.score_fields = True
+    for option in ("explain", "required_first", "passthrough_extra", "native"):
+        setattr(field_schema, option, False)
+    field_schema.min_score = field_schema.ordering = field_schema.profiler = None
+    field_schema.fail_fast = True
+    apply_field = to_python(field_schema)
+
+    present = column.map(_given).astype(bool)
+    if field.required and not present.all():
+        raise ValueError("{}  required but not specified".format(field.name))
+
+    values = []
+    ratios = []
+    for value, given in zip(column, present):
+        output = apply_field({field.name: value} if given else {})
+        values.append(output.get(field.name, None))
+        ratios.append(output["__metadata__"]["field_scores"].get(field.name, 0.0))
+    return (
+        pandas.Series(values, index=column.index, dtype=object),
+        pandas.Series(ratios, index=column.index, dtype=float),
+        present,
+    )
+
+
+def _given(value):
+    """Missing values of a frame are None or NaN, and are treated as fields that were not given"""
+    if value is None or (type(value) == float and value != value):
+        return False
+    return bool(value)
+
+
+def _apply(schema, validator, values):
+    """Applies a validator to a column, returning the new values and which passed"""
+    name = validator.construct.name
+    function = schema.supported_types[name]
+    kernel = _kernels.get(function, None)
+    if kernel and schema.supported_types.info(name).vectorizable:
+        try:
+            result = kernel(values, *validator.args, **validator.kwargs)
+        except (AttributeError, OverflowError, TypeError, ValueError):
+            result = NotImplemented
+        if result is not NotImplemented:
+            return result
+
+    new_values = []
+    passed = []
+    for value in values:
+        try:
+            new_values.append(function(value, *validator.args, **validator.kwargs))
+            passed.append(True)
+        except Exception:
+            new_values.append(value)
+            passed.append(False)
+    return (
+        pandas.Series(new_values, index=values.index, dtype=object),
+        pandas.Series(passed, index=values.index, dtype=bool),
+    )
+
+
+def _bounds(values, passed, minimum, maximum, cut, pad):
+    if minimum is not None:
+        below = values < minimum
+        if pad:
+            values = values.mask(below, minimum)
+        else:
+            passed &= ~below
+    if maximum is not None:
+        above = values > maximum
+        if cut:
+            values = values.mask(above, maximum)
+        else:
+            passed &= ~above
+    return values.astype(object), passed
+
+
+def _number_kernel(kind, inferred_types):
+    def kernel(values, minimum=None, maximum=None, cut=False, pad=False):
+        if pandas.api.types.infer_dtype(values, skipna=False) not in inferred_types:
+            return NotImplemented
+        values = values.astype(kind)
+        passed = pandas.Series(True, index=values.index)
+        return _bounds(values, passed, minimum, maximum, cut, pad)
+
+    return kernel
+
+
+def _string_kernel(
+    values,
+    shortest=None,
+    longest=None,
+    cut=False,
+    lower=False,
+    upper=False,
+    strip=False,
+    pad=False,
+    align="<",
+):
+    if pad and (type(pad) != str or len(pad) != 1 or align not in ("<", ">")):
+        return NotImplemented
+
+    values = values.map(str)
+    passed = pandas.Series(True, index=values.index)
+    if shortest is not None:
+        short = values.str.len() < shortest
+        if pad:
+            side = "right" if align == "<" else "left"
+            values = values.mask(short, values.str.pad(shortest, side=side, fillchar=pad))
+        else:
+            passed &= ~short
+    if longest is not None:
+        long = values.str.len() > longest
+        if cut:
+            values = values.mask(long, values.str.slice(0, longest))
+        else:
+            passed &= ~long
+    if lower:
+        values = values.str.lower()
+    if upper:
+        values = values.str.upper()
+    if strip:
+        values = values.str.strip()
+    return values.astype(object), passed
+
+
+def _one_of_kernel(values, *allowed, case_insensitive=True):
+    if pandas.api.types.infer_dtype(values, skipna=False) != "string":
+        return NotImplemented
+
+    if case_insensitive:
+        passed = values.str.lower().isin([value.lower() for value in allowed])
+    else:
+        passed = values.isin(allowed)
+    return values, passed.astype(bool)
+
+
+def _match_kernel(values, regex):
+    if pandas.api.types.infer_dtype(values, skipna=False) != "string":
+        return NotImplemented
+
+    return values, values.str.match(regex).astype(bool)
+
+
+_kernels = {
+    types.number: _number_kernel(int, ("integer", "boolean")),
+    types.floating_number: _number_kernel(float, ("integer", "boolean", "floating")),
+    types.string: _string_kernel,
+    types.one_of: _one_of_kernel,
+    types.match: _match_kernel,
+}
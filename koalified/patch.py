@@ -0,0 +1,144 @@
+"""Revalidates previously validated records after a patch, rerunning only the touched fields"""
+import weakref
+
+from koalified.compile import _read_construct, _score_paths
+
+_score_orders = weakref.WeakKeyDictionary()
+
+
+def revalidate(schema, previous, patch):
+    """Returns what validating the record behind `previous` with `patch` merged in would return.
+
+    Patches are merged like the record itself: nested dictionaries are merged field by field,
+    while any other value, including None, replaces the field. Only the patched fields are
+    validated, using a projection of the schema, and the score is recomputed from the
+    `field_scores` of the previous result. Fields and field scores are put back in declaration
+    order, so the result is identical to validating the whole record, down to its key order.
+    Unchanged values are shared with `previous`.
+    """
+    metadata = previous["__metadata__"]
+    if not schema.score_fields:
+        raise ValueError("Revalidating records requires a schema with score_fields set")
+    if schema.explain or schema.min_score is not None:
+        raise ValueError("Revalidating records is not supported with explain or min_score")
+    if metadata["schema_version"] != schema.version:
+        raise ValueError(
+            "The previous result was validated by version {} of the schema, not {}".format(
+                metadata["schema_version"], schema.version
+            )
+        )
+
+    score_order = _score_order(schema)
+    paths = []
+    extras = []
+    _patched_paths(schema, schema.definition, patch, paths, extras)
+
+    output = dict(previous)
+    output["__metadata__"] = dict(metadata)
+    field_scores = output["__metadata__"]["field_scores"] = dict(metadata["field_scores"])
+    if paths:
+        result = schema.project([".".join(path) for path, _ in paths])(patch)
+        for path, group in paths:
+            _replace(output, result, path)
+            prefix = ".".join(path)
+            if group:
+                for _, field_path in score_order:
+                    if field_path.startswith(prefix + "."):
+                        field_scores.pop(field_path, None)
+            else:
+                field_scores.pop(prefix, None)
+        field_scores.update(result["__metadata__"]["field_scores"])
+
+    for path, field, value in extras:
+        parent = _parent(output, path + (field,))
+        if value is not None:
+            parent[field] = value
+        else:
+            parent.pop(field, None)
+
+    score = 0
+    possible_score = 0
+    ordered_scores = {}
+    for weight, field_path in score_order:
+        if field_path in field_scores:
+            ordered_scores[field_path] = field_scores[field_path]
+            score += weight * field_scores[field_path]
+            possible_score += weight
+    output["__metadata__"]["field_scores"] = ordered_scores
+    output["__metadata__"]["score"] = score / possible_score
+    return _declaration_order(output, schema.definition, patch, ("__metadata__",))
+
+
+def _score_order(schema):
+    score_order = _score_orders.get(schema, None)
+    if score_order is None:
+        if _multiple_groups(schema.definition):
+            raise ValueError("Revalidating records is not supported with multiple nested fields")
+        score_order = _score_orders[schema] = tuple(_score_paths(schema.definition))
+    return score_order
+
+
+def _multiple_groups(fields):
+    """Returns if any nested fields allow multiple values, whose field scores are not kept apart"""
+    return any(
+        type(validators) == dict and (_read_construct(key).multiple or _multiple_groups(validators))
+        for key, validators in fields.items()
+    )
+
+
+def _patched_paths(schema, fields, patch, paths, extras, path=()):
+    defined = {_read_construct(key).name: validators for key, validators in fields.items()}
+    for field, value in patch.items():
+        if field in defined and field != "**":
+            group = type(defined[field]) == dict
+            if group and type(value) == dict:
+                _patched_paths(schema, defined[field], value, paths, extras, path + (field,))
+            else:
+                paths.append((path + (field,), group))
+        elif "**" in defined:
+            if defined["**"] and not schema.passthrough_extra:
+                raise ValueError(
+                    "Revalidating extra fields is only supported when they are passed through"
+                )
+            extras.append((path, field, value))
+
+
+def _declaration_order(output, fields, patch, first=()):
+    """Returns the output with the fields at each patched level in declaration order.
+
+    Extra fields follow the defined ones in the order they were given, as they do when
+    validating the whole record.
+    """
+    names = list(first)
+    groups = {}
+    for key, validators in fields.items():
+        name = _read_construct(key).name
+        if name != "**":
+            names.append(name)
+            if type(validators) == dict and type(patch.get(name, None)) == dict:
+                groups[name] = validators
+
+    ordered = {name: output[name] for name in names if name in output}
+    ordered.update((field, value) for field, value in output.items() if field not in ordered)
+    for name, validators in groups.items():
+        if type(ordered.get(name, None)) == dict:
+            ordered[name] = _declaration_order(ordered[name], validators, patch[name])
+    return ordered
+
+
+def _parent(output, path):
+    """Returns the dictionary holding the last field of the path, copying it and its parents"""
+    for field in path[:-1]:
+        output[field] = dict(output[field])
+        output = output[field]
+    return output
+
+
+def _replace(output, result, path):
+    parent = _parent(output, path)
+    for field in path[:-1]:
+        result = result[field]
+    if path[-1] in result:
+        parent[path[-1]] = result[path[-1]]
+    else:
+        parent.pop(path[-1], None)
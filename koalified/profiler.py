@@ -0,0 +1,97 @@
+"""Gathers validator cost and failure statistics to learn a faster validation order"""
+from time import perf_counter
+
+
+class Profiler(object):
+    def __init__(self, warmup=1000):
+        self.warmup = warmup
+        self.records = 0
+        self.sites = {}
+        self.missed = {}
+
+    def register(self, field_path, index, mutate, raising):
+        """Registers a validator call site, returning its key"""
+        self.sites.setdefault((field_path, index), [0, 0, 0.0, mutate, raising])
+        return (field_path, index)
+
+    def __call__(self, site, function, value, *args, **kwargs):
+        stats = self.sites[site]
+        start = perf_counter()
+        try:
+            return function(value, *args, **kwargs)
+        except Exception:
+            stats[1] += 1
+            raise
+        finally:
+            stats[0] += 1
+            stats[2] += perf_counter() - start
+
+    def missing(self, field_path):
+        """Records that a required field was not given"""
+        self.missed[field_path] = self.missed.get(field_path, 0) + 1
+
+    @property
+    def done(self):
+        return self.records >= self.warmup
+
+    def ordering(self, schema_version=None):
+        """Returns the learned validation order.
+
+        Top-level fields and validators whose failure rejects the record are ordered cheapest
+        per rejection first. Validators never move across a mutating (`=`) validator.
+        """
+        field_costs = {}
+        field_rejections = {}
+        fields = {}
+        for (field_path, index), (calls, failures, seconds, mutate, raising) in self.sites.items():
+            name = field_path.split(".", 1)[0]
+            field_costs[name] = field_costs.get(name, 0.0) + seconds
+            if raising:
+                field_rejections[name] = field_rejections.get(name, 0) + failures
+            fields.setdefault(field_path, {})[index] = (
+                _rank(seconds / calls if calls else 0.0, failures / calls if calls else 0.0),
+                mutate,
+                raising,
+            )
+        for field_path, missed in self.missed.items():
+            name = field_path.split(".", 1)[0]
+            field_rejections[name] = field_rejections.get(name, 0) + missed
+
+        records = self.records or 1
+        field_ranks = {
+            name: _rank(field_costs.get(name, 0.0) / records, rejections / records)
+            for name, rejections in field_rejections.items()
+            if rejections
+        }
+
+        validators = {}
+        for field_path, sites in fields.items():
+            order = []
+            run = []
+            for index in range(max(sites) + 1):
+                rank, mutate, raising = sites.get(index, (None, True, False))
+                if mutate:
+                    order.extend(_order_run(run, sites))
+                    order.append(index)
+                    run = []
+                else:
+                    run.append(index)
+            order.extend(_order_run(run, sites))
+            if order != sorted(order):
+                validators[field_path] = order
+
+        return {
+            "schema_version": schema_version,
+            "fields": sorted(field_ranks, key=field_ranks.get),
+            "validators": validators,
+        }
+
+
+def _rank(cost, rejection_rate):
+    return cost / rejection_rate if rejection_rate else float("inf")
+
+
+def _order_run(run, sites):
+    raising = [index for index in run if sites[index][2] and sites[index][0] != float("inf")]
+    raising.sort(key=lambda index: sites[index][0])
+    return raising + [index for index in run if index not in raising]
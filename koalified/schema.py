@@ -1,8 +1,19 @@
+import copy
+import json
+
 import requests
 import xxhash
 import yaml
-from koalified import types
-from koalified.compile import to_python
+from koalified import ingest, instrument, patch, types
+from koalified.cache import ValidationCache
+from koalified.codec import Codec
+from koalified.compile import _read_construct, resolve_types, to_python
+from koalified.profiler import Profiler
+
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
 
 
 class Schema(object):
@@ -16,14 +27,48 @@ class Schema(object):
         score_fields=False,
         explain=False,
         precompile=False,
+        passthrough_extra=False,
+        min_score=None,
+        required_first=False,
+        profile=None,
+        ordering=None,
+        cost_order=False,
+        cache=None,
+        native=False,
     ):
-        self.supported_types = supported_types
+        self.supported_types = types.registry(supported_types)
+        self.uri = uri
         self.definition = self._load_definition(uri=uri, text=text, allow_imports=allow_imports)
         self.metadata = self.definition.pop("__metadata__", {})
+        used_types = resolve_types(self)
         self.version = self.metadata["schema_version"]
         self.fail_fast = fail_fast
         self.score_fields = score_fields
         self.explain = explain
+        self.passthrough_extra = passthrough_extra
+        self.min_score = min_score
+        self.required_first = required_first
+        self.profiler = Profiler(profile) if profile else None
+        if type(ordering) == str:
+            with open(ordering) as ordering_file:
+                ordering = json.load(ordering_file)
+        if ordering and ordering.get("schema_version") not in (None, self.version):
+            ordering = None
+        self.ordering = ordering
+        self.cost_order = cost_order
+        if cache:
+            impure = [name for name in used_types if not self.supported_types.info(name).pure]
+            if impure:
+                raise ValueError(
+                    "Results can only be cached for pure types, which {} are not".format(
+                        ", ".join(impure)
+                    )
+                )
+        self.cache = ValidationCache(cache) if cache else None
+        self.native = native
+        self.projected = False
+        self._codec = None
+        self._projections = {}
         if precompile:
             self._compiled = to_python(self)
         else:
@@ -54,23 +99,68 @@ class Schema(object):
         elif uri and text:
             raise ValueError("You cannot specify multiple sources. Choose one: uri or text.")
 
-        if uri:
-            if uri.startswith("http"):
-                text = requests.get(uri).content
-            else:
-                uri = uri[len("file://") :] if uri.startswith("file://") else uri
-                with open(uri) as schema_file:
-                    text = schema_file.read()
+        with instrument.hooks.span("koalified.load_definition", uri=uri):
+            if uri:
+                if uri.startswith("http"):
+                    with instrument.hooks.span("koalified.import", uri=uri):
+                        text = requests.get(uri).content
+                else:
+                    uri = uri[len("file://") :] if uri.startswith("file://") else uri
+                    with open(uri) as schema_file:
+                        text = schema_file.read()
 
-        definition = yaml.safe_load(text)
-        if allow_imports:
-            self._add_imports(definition)
+            definition = self._parse(text)
+            if allow_imports:
+                self._add_imports(definition)
 
-        metadata = definition.setdefault("__metadata__", {})
-        if not metadata.get("schema_version", None):
-            metadata["schema_version"] = xxhash.xxh32(text).hexdigest()
+            metadata = definition.setdefault("__metadata__", {})
+            if not metadata.get("schema_version", None):
+                metadata["schema_version"] = xxhash.xxh32(text).hexdigest()
 
-        return definition
+            return definition
+
+    @staticmethod
+    def _parse(text):
+        if text.lstrip()[:1] in ("{", b"{"):
+            try:
+                return json.loads(text)
+            except ValueError:
+                pass
+
+        return yaml.load(text, Loader=SafeLoader)
+
+    def export(self, path=None):
+        """Returns the resolved schema as JSON that can be loaded back in without YAML parsing"""
+        definition = dict(self.definition)
+        definition["__metadata__"] = self.metadata
+        artifact = json.dumps(definition)
+        if path:
+            with open(path, "w") as artifact_file:
+                artifact_file.write(artifact)
+
+        return artifact
+
+    def save_ordering(self, path=None):
+        """Saves the learned validation order, by default next to a locally loaded schema"""
+        if not path:
+            if not self.uri or self.uri.startswith("http"):
+                raise ValueError("A path must be given for schemas not loaded from a local file")
+            path = self.uri[len("file://") :] if self.uri.startswith("file://") else self.uri
+            path += ".ordering.json"
+
+        with open(path, "w") as ordering_file:
+            json.dump(self.ordering or {}, ordering_file)
+
+        return path
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_compiled"] = False
+        state["_projections"] = {}
+        state["profiler"] = None
+        if self.cache is not None:
+            state["cache"] = ValidationCache(self.cache.maxsize)
+        return state
 
     def compiled(self):
         if not self._compiled:
@@ -78,5 +168,118 @@ class Schema(object):
 
         return self._compiled
 
+    def project(self, paths, required=False):
+        """Returns a function that only validates and scores the given field paths.
+
+        Paths are dot separated, such as `contact.phone`, and a path to a nested group of fields
+        covers all of it. If `required` is set, the required fields next to each projected field
+        are checked as well. If none of the projected fields add to the possible score, the score
+        is None. Compiled projections are cached per set of paths.
+        """
+        key = (tuple(sorted(set(paths))), required)
+        if key not in self._projections:
+            projection = copy.copy(self)
+            projection.definition = _project(
+                self.definition, [tuple(path.split(".")) for path in key[0]], required
+            )
+            projection.profiler = projection.cache = None
+            projection.projected = True
+            # projections are compiled on the request path, where a native build would stall it
+            projection.native = False
+            self._projections[key] = to_python(projection)
+
+        return self._projections[key]
+
+    def revalidate(self, previous, changes):
+        """Returns the result of applying changes to an already validated record.
+
+        Only the changed fields are validated again, and the result is identical to validating
+        the whole updated record. Requires `score_fields`.
+        """
+        return patch.revalidate(self, previous, changes)
+
     def __call__(self, data):
+        if self.cache is not None:
+            return self.cache.apply(self._apply, data)
+        return self._apply(data)
+
+    def apply_bytes(self, buffer):
+        """Validates a single JSON encoded record, returning the JSON encoded output"""
+        return ingest.dumps(self(ingest.loads(buffer)))
+
+    def apply_many_bytes(self, buffer):
+        """Validates newline delimited JSON records, yielding the JSON encoded output of each"""
+        hooks = instrument.hooks
+        for line in ingest.lines(buffer):
+            if not hooks.enabled:
+                yield ingest.dumps(self(ingest.loads(line)))
+                continue
+
+            hooks.count("koalified.records")
+            try:
+                output = self(ingest.loads(line))
+            except Exception as error:
+                hooks.count("koalified.errors", error=type(error).__name__)
+                raise
+            metadata = output["__metadata__"]
+            if metadata.get("rejected", False):
+                hooks.count("koalified.rejected")
+            hooks.observe("koalified.score", metadata["score"])
+            yield ingest.dumps(output)
+
+    def codec(self):
+        if not self._codec:
+            self._codec = Codec(self)
+
+        return self._codec
+
+    def encode(self, output):
+        """Encodes a validated record into the schema's compact binary format"""
+        return self.codec().encode(output)
+
+    def decode(self, buffer):
+        """Decodes a record encoded by `encode`"""
+        return self.codec().decode(buffer)
+
+    def _apply(self, data):
+        if self.profiler:
+            return self._profile(data)
         return self.compiled()(data)
+
+    def _profile(self, data):
+        try:
+            return self.compiled()(data)
+        finally:
+            self.profiler.records += 1
+            if self.profiler.done:
+                self.ordering = self.profiler.ordering(self.version)
+                self.profiler = None
+                self._compiled = to_python(self)
+
+
+def _project(fields, paths, required, path=()):
+    """Returns the part of a definition that covers the given field paths, in declaration order"""
+    keys = {_read_construct(key).name: key for key in fields}
+    wanted = {}
+    for field_path in paths:
+        key = keys.get(field_path[0], None)
+        if key is None:
+            raise ValueError(
+                'Field "{}" is not defined by the schema'.format(".".join(path + field_path[:1]))
+            )
+        wanted.setdefault(key, []).append(field_path[1:])
+
+    projected = {}
+    for key, validators in fields.items():
+        field = _read_construct(key)
+        if key in wanted:
+            nested_paths = wanted[key]
+            if all(nested_paths):
+                if type(validators) != dict:
+                    raise ValueError('Field "{}" has no nested fields'.format(field.name))
+                validators = _project(validators, nested_paths, required, path + (field.name,))
+            projected[key] = validators
+        elif required and field.required:
+            projected[key] = validators
+
+    return projected
@@ -1,4 +1,5 @@
 import re
+from collections import namedtuple
 from datetime import datetime
 from ipaddress import ip_address
 
@@ -7,15 +8,130 @@ import phonenumbers
 import pycountry
 import validators
 
-built_in = {}
+try:
+    import re2 as regex_engine
+except ImportError:
+    regex_engine = re
+
+type_info = namedtuple("TypeInfo", ["pure", "vectorizable", "asynchronous", "cost", "prepare"])
+UNKNOWN = type_info(pure=False, vectorizable=False, asynchronous=False, cost=None, prepare=None)
+
+
+class TypeRegistry(dict):
+    """Maps type names to their validators, along with what is known about each type.
+
+    A type is `pure` if its result only depends on its arguments, so results can be cached, and
+    `vectorizable` if it has a column-wise implementation. `cost` is a relative estimate of how
+    expensive a call is, used to order validators when no profile has been learned. `prepare`,
+    if given, converts a validator's positional arguments once when the schema is compiled.
+    """
+
+    def __init__(self, types=None, info=None):
+        super().__init__(types or {})
+        self.type_info = dict(info or {})
+
+    def register(
+        self,
+        name,
+        function=None,
+        pure=False,
+        vectorizable=False,
+        asynchronous=False,
+        cost=None,
+        prepare=None,
+    ):
+        """Adds a type, returning a decorator if no function is given"""
+        if function is None:
+            return lambda function: self.register(
+                name, function, pure, vectorizable, asynchronous, cost, prepare
+            )
+
+        self[name] = function
+        self.type_info[name] = type_info(pure, vectorizable, asynchronous, cost, prepare)
+        return function
 
+    def info(self, name):
+        return self.type_info.get(name, UNKNOWN)
 
-def _register(name):
-    def add_type(function):
-        built_in[name] = function
+    def resolve(self, name):
+        """Returns the validator for a type name, raising a ValueError if it is unknown"""
+        function = self.get(name, None)
+        if function is None:
+            raise ValueError(
+                'Unknown type "{}", not one of the supported types: {}'.format(
+                    name, ", ".join(self.keys())
+                )
+            )
         return function
 
-    return add_type
+    def copy(self):
+        return TypeRegistry(self, self.type_info)
+
+
+def registry(supported_types):
+    """Returns the given types as a TypeRegistry, keeping what is known about built-in types"""
+    if isinstance(supported_types, TypeRegistry):
+        return supported_types
+
+    return TypeRegistry(
+        supported_types,
+        {
+            name: built_in.info(name)
+            for name, function in supported_types.items()
+            if built_in.get(name, None) is function
+        },
+    )
+
+
+built_in = TypeRegistry()
+
+
+def _register(name, vectorizable=False, cost=1, prepare=None):
+    return built_in.register(name, pure=True, vectorizable=vectorizable, cost=cost, prepare=prepare)
+
+
+def set_regex_engine(engine=None):
+    """Sets the module used to compile `match` patterns, such as `re2` or `regex`.
+
+    Patterns the engine can not compile, like backreferences with `re2`, fall back to `re`.
+    """
+    global regex_engine
+    regex_engine = engine or re
+
+
+def compile_pattern(regex):
+    """Returns the compiled pattern for a regular expression using the configured engine"""
+    try:
+        return regex_engine.compile(regex)
+    except Exception:
+        if regex_engine is re:
+            raise
+        return re.compile(regex)
+
+
+def _compile_patterns(*regexes):
+    return tuple(compile_pattern(regex) for regex in regexes)
+
+
+def _combine_patterns(*regexes):
+    """Combines patterns into a single alternation.
+
+    Patterns are kept apart if any of them has groups, as combining them would renumber the
+    groups and break backreferences, or if the alternation does not compile.
+    """
+    patterns = _compile_patterns(*regexes)
+    if any(pattern.groups for pattern in patterns):
+        return patterns
+    try:
+        return (compile_pattern("|".join("(?:{})".format(regex) for regex in regexes)),)
+    except Exception:
+        return patterns
+
+
+def _matches(regex, value):
+    if type(regex) == str:
+        return re.match(regex, value)
+    return regex.match(value)
 
 
 @_register("bool")
@@ -27,7 +143,7 @@ def string_boolean(value):
         return True
 
 
-@_register("int")
+@_register("int", vectorizable=True)
 def number(value, minimum=None, maximum=None, cut=False, pad=False):
     """Returns back an integer from the given value"""
     value = int(value)
@@ -46,7 +162,7 @@ def number(value, minimum=None, maximum=None, cut=False, pad=False):
     return value
 
 
-@_register("float")
+@_register("float", vectorizable=True)
 def floating_number(value, minimum=None, maximum=None, cut=False, pad=False):
     """Returns back a float from the given value"""
     value = float(value)
@@ -65,7 +181,7 @@ def floating_number(value, minimum=None, maximum=None, cut=False, pad=False):
     return value
 
 
-@_register("str")
+@_register("str", vectorizable=True)
 def string(
     value,
     shortest=None,
@@ -108,20 +224,32 @@ def string(
     return value
 
 
-@_register("match")
+@_register("match", vectorizable=True, cost=2, prepare=_compile_patterns)
 def match(value, regex):
-    """Returns back a string if it matches the given regex"""
-    if not re.match(regex, value):
+    """Returns back a string if it matches the given regex, which may already be compiled"""
+    if not _matches(regex, value):
         raise ValueError(
             "Provided value of {} does not match specified regular expression {}".format(
-                value, regex
+                value, getattr(regex, "pattern", regex)
             )
         )
 
     return value
 
 
-@_register("ip")
+@_register("match_any", cost=3, prepare=_combine_patterns)
+def match_any(value, *regexes):
+    """Returns back a string if it matches any of the given regexes"""
+    for regex in regexes:
+        if _matches(regex, value):
+            return value
+
+    raise ValueError(
+        "Provided value of {} does not match any of the specified regular expressions".format(value)
+    )
+
+
+@_register("ip", cost=3)
 def ip(value, minimum=None, maximum=None, cut=False, pad=False, version=None):
     """Returns back an IP Address, potentially within a minimum/maximum range"""
     address = ip_address(value)
@@ -147,7 +275,7 @@ def ip(value, minimum=None, maximum=None, cut=False, pad=False, version=None):
     return address
 
 
-@_register("phone")
+@_register("phone", cost=20)
 def phonenumber(value, default_country=None, format="E164", digits_only=True):
     number = phonenumbers.parse(value, default_country)
     if format:
@@ -158,7 +286,7 @@ def phonenumber(value, default_country=None, format="E164", digits_only=True):
     return number
 
 
-@_register("one_of")
+@_register("one_of", vectorizable=True)
 def one_of(value, *values, case_insensitive=True):
     check_value = value
     if case_insensitive:
@@ -173,29 +301,29 @@ def one_of(value, *values, case_insensitive=True):
     return value
 
 
-@_register("date")
+@_register("date", cost=20)
 def date(value, format="YYYY-MM-DD"):
     return arrow.get(value).format(format)
 
 
-@_register("datetime")
+@_register("datetime", cost=20)
 def date_time(value, format="YYYY-MM-DD HH:MM"):
     return date(value, format)
 
 
-@_register("strict_date")
+@_register("strict_date", cost=5)
 def strict_date(value, input_format="%Y-%m-%d", output_format=None):
     if not output_format:
         output_format = input_format
     return datetime.strptime(value, input_format).strftime(output_format)
 
 
-@_register("strict_datetime")
+@_register("strict_datetime", cost=5)
 def strict_datetime(value, input_format="%Y-%m-%d %H:%S", output_format=None):
     return strict_date(value, input_format, output_format)
 
 
-@_register("postal")
+@_register("postal", cost=2)
 def postal(value, strip=False):
     """A very generic postal code validator that is meant to allow all international postal codes through"""
     if strip:
@@ -240,14 +368,14 @@ def postal(value, strip=False):
     return value
 
 
-@_register("country")
+@_register("country", cost=10)
 def country(value, output_format="alpha_3"):
     return getattr(pycountry.countries.lookup(value), output_format)
 
 
-_register("email")(validators.email)
-_register("domain")(validators.domain)
-_register("mac")(validators.mac_address)
+_register("email", cost=5)(validators.email)
+_register("domain", cost=5)(validators.domain)
+_register("mac", cost=3)(validators.mac_address)
 _register("md5")(validators.md5)
 _register("sha1")(validators.sha1)
 _register("sha224")(validators.sha224)
@@ -255,7 +383,7 @@ _register("sha256")(validators.sha256)
 _register("sha512")(validators.sha512)
 _register("uuid")(validators.uuid)
 _register("slug")(validators.slug)
-_register("iban")(validators.iban)
+_register("iban", cost=5)(validators.iban)
 _register("dict")(dict)
 _register("list")(list)
 _register("tuple")(tuple)
@@ -74,11 +74,7 @@ setup(
     author_email="timothy@domaintools.com",
     url="https://github.com/domaintools/koalified_python",
     license="MIT",
-    # entry_points={
-    #   'console_scripts': [
-    #      'koalified = koalified:run.terminal',
-    #   ]
-    # },
+    entry_points={"console_scripts": ["koalified = koalified.cli:main"]},
     packages=["koalified"],
     requires=[],
     install_requires=[
@@ -90,7 +86,12 @@ setup(
         "pycountry",
         "arrow",
     ],
-    extras_require={"cython": ["Cython>=0.24"]},
+    extras_require={
+        "cython": ["Cython>=0.24"],
+        "json": ["orjson"],
+        "pandas": ["pandas"],
+        "otel": ["opentelemetry-api"],
+    },
     cmdclass=cmdclass,
     ext_modules=ext_modules,
     keywords="Python, Python3",
@@ -0,0 +1,60 @@
+import json
+
+from koalified.analyze import analyze, format_report
+from koalified.cli import main
+from koalified.schema import Schema
+
+EXAMPLE_SCHEMA = """
+name!: [str=, "match ^[a-z]+$"]
+phone: phone=
+contact+:
+    kind: one_of phone email
+    address:
+        city: str
+'**': str=
+"""
+
+
+def test_analyze():
+    report = analyze(Schema(text=EXAMPLE_SCHEMA), number=10)
+    assert report["fields"] == 5
+    assert report["groups"] == 2
+    assert report["required"] == 1
+    assert report["multiple"] == 1
+    assert report["depth"] == 3
+    assert report["validators"] == 6
+    assert report["max_validators"] == 2
+    assert report["types"] == {"str": 3, "match": 1, "phone": 1, "one_of": 1}
+    assert report["expensive_types"] == ["phone"]
+    assert report["code_lines"] > 10
+    assert report["compile_seconds"] > 0
+    assert report["estimated_seconds"] == sum(report["field_seconds"].values()) > 0
+    assert sorted(report["field_seconds"]) == [
+        "**",
+        "contact.address.city",
+        "contact.kind",
+        "name",
+        "phone",
+    ]
+    assert any(hot_spot.startswith("contact:") for hot_spot in report["hot_spots"])
+    assert any(hot_spot.startswith("**:") for hot_spot in report["hot_spots"])
+    assert any("without a cache" in hot_spot for hot_spot in report["hot_spots"])
+    assert report["approximate"] == []
+    assert "estimated cost" in format_report(report)
+
+    unmatched = analyze(Schema(text='code: "match ^id-[0-9]+$"\nkind: one_of A B'), number=10)
+    assert unmatched["approximate"] == ["code"]
+    assert "approximate, no sample was accepted: code" in format_report(unmatched)
+
+    cached = analyze(Schema(text=EXAMPLE_SCHEMA, cache=10, passthrough_extra=True), number=10)
+    assert not any("**" in hot_spot or "cache" in hot_spot for hot_spot in cached["hot_spots"])
+
+
+def test_cli(tmpdir, capsys):
+    schema_path = tmpdir.join("schema.yaml")
+    schema_path.write(EXAMPLE_SCHEMA)
+    assert main(["analyze", str(schema_path), "--number", "10", "--json"]) == 0
+    assert json.loads(capsys.readouterr().out)["fields"] == 5
+    assert main(["analyze", str(schema_path), "--number", "10"]) == 0
+    assert "hot spots:" in capsys.readouterr().out
+    assert main([]) == 2
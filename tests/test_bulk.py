@@ -0,0 +1,106 @@
+import json
+import os
+
+from koalified.bulk import _chunks, validate_file
+from koalified.schema import Schema
+
+EXAMPLE_SCHEMA = """
+name: str
+age!: int=
+"""
+
+
+def _write_records(tmpdir):
+    path = tmpdir.join("records.ndjson")
+    lines = []
+    for index in range(100):
+        if index % 10:
+            lines.append(json.dumps({"name": "user{}".format(index), "age": str(index)}))
+        else:
+            lines.append(json.dumps({"name": "user{}".format(index)}))
+    path.write("\n".join(lines) + "\n")
+    return str(path)
+
+
+def test_chunks(tmpdir):
+    path = _write_records(tmpdir)
+    with open(path, "rb") as records:
+        data = records.read()
+    chunks = _chunks(path, 100)
+    assert chunks[0][0] == 0 and chunks[-1][1] == len(data)
+    for (_, end), (start, _) in zip(chunks, chunks[1:]):
+        assert end == start and data[end - 1 : end] == b"\n"
+
+
+def test_validate_file(tmpdir):
+    path = _write_records(tmpdir)
+    output = tmpdir.join("output")
+    progress = []
+    stats = validate_file(
+        path,
+        Schema(text=EXAMPLE_SCHEMA, cache=10),
+        str(output),
+        workers=2,
+        chunk_size=512,
+        progress=lambda done, total: progress.append((done, total)),
+    )
+    assert stats["records"] == 100
+    assert stats["valid"] == 90
+    assert stats["rejected"] == 10
+    assert stats["score"]["mean"] == 1.0
+    assert progress[-1] == (stats["chunks"], stats["chunks"]) and stats["chunks"] > 1
+
+    valid = [
+        json.loads(line)
+        for shard in sorted(output.listdir("valid-*"))
+        for line in shard.read().splitlines()
+    ]
+    assert len(valid) == 90 and all(type(record["age"]) == int for record in valid)
+    rejected = [
+        json.loads(line)
+        for shard in output.listdir("rejected-*")
+        for line in shard.read().splitlines()
+    ]
+    assert {json.loads(record["record"])["name"] for record in rejected} == {
+        "user{}".format(index) for index in range(0, 100, 10)
+    }
+
+    checkpoint = json.loads(output.join("checkpoint.json").read())
+    del checkpoint["chunks"]["0"]
+    output.join("checkpoint.json").write(json.dumps(checkpoint))
+    progress = []
+    resumed = validate_file(
+        path,
+        Schema(text=EXAMPLE_SCHEMA),
+        str(output),
+        chunk_size=512,
+        progress=lambda done, total: progress.append((done, total)),
+    )
+    assert resumed == stats
+    assert len(progress) == 2
+
+    # changed options or a modified file invalidate the checkpoint
+    progress = []
+    validate_file(
+        path,
+        Schema(text=EXAMPLE_SCHEMA, min_score=0.9),
+        str(output),
+        chunk_size=512,
+        progress=lambda done, total: progress.append((done, total)),
+    )
+    assert progress[0] == (0, stats["chunks"])
+    progress = []
+    os.utime(path, ns=(0, 0))
+    validate_file(
+        path,
+        Schema(text=EXAMPLE_SCHEMA, min_score=0.9),
+        str(output),
+        chunk_size=512,
+        progress=lambda done, total: progress.append((done, total)),
+    )
+    assert progress[0] == (0, stats["chunks"])
+
+    # shards of chunks beyond the last one are left from a run with more chunks
+    stats = validate_file(path, Schema(text=EXAMPLE_SCHEMA), str(output), chunk_size=2048)
+    assert stats["chunks"] > 1 and stats["valid"] == 90
+    assert len(output.listdir("valid-*")) == len(output.listdir("rejected-*")) == stats["chunks"]
@@ -0,0 +1,83 @@
+import pytest
+from koalified import cache
+from koalified.cache import ValidationCache
+from koalified.schema import Schema
+
+EXAMPLE_SCHEMA = """
+name: str
+age!: int=
+contact+:
+    phone: str
+"""
+
+
+def test_cached_schema():
+    schema = Schema(text=EXAMPLE_SCHEMA, cache=2)
+    record = {"name": "tim", "age": "5", "contact": [{"phone": "410"}]}
+    first = schema(record)
+    first["contact"][0]["phone"] = "changed"
+    second = schema(dict(record))
+    assert second == schema(record) != first
+    assert second["contact"][0]["phone"] == "410"
+    assert schema.cache.stats()["hits"] == 2
+
+    with pytest.raises(ValueError):
+        schema({"name": "tim", "contact": []})
+    with pytest.raises(ValueError):
+        schema({"name": "tim", "contact": []})
+    # the first record and its contact item were each a miss
+    assert schema.cache.hits == 3
+    assert schema.cache.misses == 3
+    assert schema.cache.hit_rate == 0.5
+
+    schema({"age": "1", "contact": []})
+    assert schema.cache.stats()["size"] == 2
+    schema(record)
+    assert schema.cache.misses == 6
+
+
+def test_cached_input_changes():
+    schema = Schema(text="tags+: str\nmeta: dict", cache=10)
+    record = {"tags": ["a"], "meta": {"k": 1}}
+    schema(record)
+    record["tags"].append("b")
+    record["meta"]["k"] = 2
+    output = schema({"tags": ["a"], "meta": {"k": 1}})
+    assert output["tags"] == ["a"] and output["meta"] == {"k": 1}
+    assert schema.cache.hits == 1
+
+
+def test_cached_items():
+    schema = Schema(text=EXAMPLE_SCHEMA, cache=10, score_fields=True, explain=True)
+    contact = {"phone": 410}
+    records = [{"age": str(age), "contact": [contact, {"phone": "x"}, contact]} for age in (1, 2)]
+    outputs = [schema(record) for record in records]
+    assert outputs == [
+        Schema(text=EXAMPLE_SCHEMA, score_fields=True, explain=True)(record) for record in records
+    ]
+    assert schema.cache.stats()["misses"] == 4
+    assert schema.cache.stats()["hits"] == 4
+    outputs[0]["contact"][0]["phone"] = "changed"
+    assert schema(records[1])["contact"][2] == {"phone": 410}
+
+
+def test_cache_collisions(monkeypatch):
+    class Colliding(object):
+        def __init__(self, text):
+            pass
+
+        def intdigest(self):
+            return 0
+
+    schema = Schema(text=EXAMPLE_SCHEMA, cache=10, precompile=True)
+    monkeypatch.setattr(cache.xxhash, "xxh64", Colliding)
+    assert schema({"age": "1", "contact": []})["age"] == 1
+    assert schema({"age": "2", "contact": []})["age"] == 2
+    assert schema({"age": "1", "contact": []})["age"] == 1
+    assert schema.cache.hits == 0
+
+
+def test_cache_key():
+    assert ValidationCache.key({"a": 1}) == ValidationCache.key({"a": 1})
+    assert ValidationCache.key({"a": 1}) != ValidationCache.key({"a": "1"})
+    assert ValidationCache.key({"a": 1}) != ValidationCache.key({"a": 1}, "contact")
@@ -0,0 +1,75 @@
+import io
+import json
+
+import pytest
+from koalified import codec
+from koalified.schema import Schema
+
+EXAMPLE_SCHEMA = """
+name: str
+age: int=
+height: float=
+status: one_of active inactive
+tags+: str
+contact+:
+    kind: one_of phone fax
+    phone: int=
+'**': str
+"""
+
+RECORD = {
+    "name": "timothy",
+    "age": "29",
+    "height": "-1.5",
+    "status": "active",
+    "tags": ["a", "b"],
+    "contact": [{"kind": "phone", "phone": "-410"}, {"kind": "Fax", "extra": None}],
+    "nickname": "tim",
+}
+
+
+def test_encode_decode():
+    schema = Schema(text=EXAMPLE_SCHEMA, score_fields=True)
+    output = schema(RECORD)
+    encoded = schema.encode(output)
+    assert schema.decode(encoded) == output
+    assert len(encoded) < len(json.dumps(output)) / 2
+
+    unusual = {"name": True, "age": 2**80, "status": "other", "extra": {"nested": [1, None]}}
+    assert schema.decode(schema.encode(unusual)) == unusual
+    with pytest.raises(ValueError):
+        schema.decode(b"\x01\x0f")
+    for end in range(len(encoded)):
+        with pytest.raises(ValueError):
+            schema.decode(encoded[:end])
+    for position in range(len(encoded)):
+        for byte in (codec.ENUM, codec.RECORD, 0x7F, 0xFF):
+            corrupted = bytearray(encoded)
+            corrupted[position] = byte
+            try:
+                schema.decode(bytes(corrupted))
+            except ValueError:
+                pass
+    with pytest.raises(ValueError, match="trailing"):
+        schema.decode(encoded + b"\x00")
+
+    changed = Schema(text=EXAMPLE_SCHEMA.replace("age: int=", "age: int=\nweight: int="))
+    with pytest.raises(ValueError, match="layout"):
+        changed.decode(encoded)
+    assert Schema(text=EXAMPLE_SCHEMA, explain=True).decode(encoded) == output
+
+
+def test_streaming():
+    schema = Schema(text=EXAMPLE_SCHEMA)
+    outputs = [schema(RECORD), schema({"name": "bob", "contact": []})]
+    stream = io.BytesIO()
+    writer = schema.codec().writer(stream)
+    for output in outputs:
+        writer.write(output)
+
+    stream.seek(0)
+    assert list(schema.codec().reader(stream)) == outputs
+    with pytest.raises(ValueError):
+        list(schema.codec().reader(io.BytesIO(stream.getvalue()[:-1])))
+    with pytest.raises(ValueError, match="layout"):
+        Schema(text="name: str").codec().reader(io.BytesIO(stream.getvalue()))
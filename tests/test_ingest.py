@@ -0,0 +1,53 @@
+import mmap
+
+import pytest
+from koalified import ingest
+from koalified.schema import Schema
+
+EXAMPLE_SCHEMA = """
+name: str
+age: int=
+address: ip=
+"""
+
+
+@pytest.fixture(params=["orjson", "json"])
+def decoder(request, monkeypatch):
+    if request.param == "json":
+        monkeypatch.setattr(ingest, "orjson", False)
+    elif not ingest.orjson:
+        pytest.skip("orjson is not installed")
+    return request.param
+
+
+def test_apply_bytes(decoder, tmpdir):
+    schema = Schema(text=EXAMPLE_SCHEMA)
+    record = b'{"name": "tim", "age": "5", "address": "127.0.0.1"}'
+    output = ingest.loads(schema.apply_bytes(memoryview(record)))
+    assert output == {
+        "__metadata__": {"schema_version": schema.version, "score": 1.0},
+        "name": "tim",
+        "age": 5,
+        "address": "127.0.0.1",
+    }
+
+    path = tmpdir.join("record.json")
+    path.write_binary(record)
+    with open(str(path), "rb") as record_file:
+        with mmap.mmap(record_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            assert ingest.loads(schema.apply_bytes(mapped)) == output
+
+
+def test_apply_many_bytes(decoder, tmpdir):
+    schema = Schema(text=EXAMPLE_SCHEMA)
+    records = b'{"name": "tim"}\n\n{"age": "5"}\n{"name": "bob", "age": 1}'
+    outputs = [ingest.loads(output) for output in schema.apply_many_bytes(records)]
+    assert [output.get("name") for output in outputs] == ["tim", None, "bob"]
+    assert [ingest.loads(line)["name"] for line in ingest.lines(bytearray(b'{"name": 1}\n'))] == [1]
+
+    path = tmpdir.join("records.ndjson")
+    path.write_binary(records + b"\n")
+    with open(str(path), "rb") as records_file:
+        with mmap.mmap(records_file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            outputs = [ingest.loads(output) for output in schema.apply_many_bytes(mapped)]
+    assert [output.get("age") for output in outputs] == [None, 5, 1]
@@ -0,0 +1,76 @@
+import pytest
+from koalified import instrument
+from koalified.schema import Schema
+
+EXAMPLE_SCHEMA = """
+name: str longest=4:int
+age!: int! minimum=1:int
+"""
+
+RECORDS = b'{"name": "tim", "age": 5}\n{"name": "timothy", "age": 5}\n{"name": "tim"}\n'
+
+
+@pytest.fixture
+def recorder():
+    recorder = instrument.Recorder()
+    previous = instrument.set_hooks(recorder)
+    yield recorder
+    instrument.set_hooks(previous)
+
+
+def test_no_hooks():
+    assert not instrument.hooks.enabled
+    with instrument.hooks.span("koalified.test", value=1) as span:
+        assert span is not None
+    instrument.hooks.count("koalified.records")
+    instrument.hooks.observe("koalified.score", 1.0)
+
+
+def test_recorder(recorder):
+    schema = Schema(text=EXAMPLE_SCHEMA, min_score=0.9)
+    outputs = schema.apply_many_bytes(RECORDS)
+    next(outputs)
+    next(outputs)
+    with pytest.raises(ValueError):
+        next(outputs)
+
+    assert recorder.span_names() == ["koalified.load_definition", "koalified.compile"]
+    assert all(seconds >= 0 for _, _, seconds in recorder.spans)
+    assert recorder.counters == {
+        "koalified.records": 3,
+        "koalified.rejected": 1,
+        "koalified.errors": 1,
+    }
+    assert recorder.observations == {"koalified.score": [1.0, 0.75]}
+
+
+def test_open_telemetry():
+    pytest.importorskip("opentelemetry.sdk")
+    from opentelemetry.sdk.metrics import MeterProvider
+    from opentelemetry.sdk.metrics.export import InMemoryMetricReader
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+    from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+
+    exporter = InMemorySpanExporter()
+    tracer_provider = TracerProvider()
+    tracer_provider.add_span_processor(SimpleSpanProcessor(exporter))
+    reader = InMemoryMetricReader()
+    hooks = instrument.OpenTelemetryHooks(tracer_provider, MeterProvider(metric_readers=[reader]))
+    previous = instrument.set_hooks(hooks)
+    try:
+        schema = Schema(text=EXAMPLE_SCHEMA)
+        list(schema.apply_many_bytes(RECORDS.split(b"\n", 2)[0]))
+    finally:
+        instrument.set_hooks(previous)
+
+    spans = exporter.get_finished_spans()
+    assert [span.name for span in spans] == ["koalified.load_definition", "koalified.compile"]
+    assert spans[1].attributes["schema_version"] == schema.version
+    metrics = {
+        metric.name
+        for resource_metrics in reader.get_metrics_data().resource_metrics
+        for scope_metrics in resource_metrics.scope_metrics
+        for metric in scope_metrics.metrics
+    }
+    assert metrics == {"koalified.records", "koalified.score"}
@@ -0,0 +1,38 @@
+from koalified.monitor import QualityMonitor
+from koalified.schema import Schema
+
+EXAMPLE_SCHEMA = """
+name: str longest=4:int
+age!: int! minimum=1:int
+"""
+
+RECORDS = [{"name": "tim", "age": "5"}, {"name": "timothy", "age": "5"}, {"name": "tim"}] * 10
+
+
+def test_rate_sampling():
+    schema = Schema(text=EXAMPLE_SCHEMA)
+    monitor = QualityMonitor(schema, rate=1)
+    monitor.observe_many(RECORDS)
+
+    report = monitor.report()
+    assert report["seen"] == report["sampled"] == 30
+    assert report["valid"] == 20
+    assert report["errors"] == {"ValueError: age  required but not specified": 10}
+    assert report["score"]["mean"] == 0.875
+    assert report["score"]["histogram"][-1] == 10
+    assert report["field_scores"] == {"name": 0.75, "age": 1.0}
+    assert not schema.score_fields
+
+    monitor = QualityMonitor(schema, rate=0.5, seed=1)
+    monitor.observe_many(RECORDS)
+    assert 0 < monitor.report()["sampled"] < 30
+
+
+def test_reservoir_sampling():
+    monitor = QualityMonitor(Schema(text=EXAMPLE_SCHEMA), reservoir=5, max_errors=0, seed=1)
+    monitor.observe_many(RECORDS)
+
+    report = monitor.report()
+    assert len(monitor.reservoir) == report["sampled"] == 5
+    assert report["seen"] == 30
+    assert report["valid"] + report["errors"].get("other", 0) == 5
@@ -0,0 +1,56 @@
+import pytest
+from koalified import native
+from koalified.schema import Schema
+
+EXAMPLE_SCHEMA = """
+name: str= longest=4:int cut=true:bool
+age: int= minimum=1:int
+contact+:
+    phone: int=
+"""
+
+
+def test_native_schema(tmpdir, monkeypatch):
+    pytest.importorskip("Cython")
+    monkeypatch.setattr(native, "CACHE_DIRECTORY", str(tmpdir))
+    record = {"name": "timothy", "age": "29", "contact": [{"phone": "410"}]}
+
+    schema = Schema(text=EXAMPLE_SCHEMA, native=True)
+    assert schema.compiled().__module__.startswith("koalified_schema_")
+    assert schema(dict(record)) == Schema(text=EXAMPLE_SCHEMA)(dict(record))
+    assert len(tmpdir.listdir(lambda path: path.ext == ".so")) == 1
+    assert tmpdir.listdir(lambda path: path.isdir()) == []
+
+    schema = Schema(text="name: str=", native=True)
+    custom = Schema(
+        text="name: str=", supported_types=dict(schema.supported_types, str=len), native=True
+    )
+    assert custom({"name": "timothy"})["name"] == 7
+    assert schema({"name": 7})["name"] == "7"
+    assert len(tmpdir.listdir(lambda path: path.ext == ".so")) == 2
+
+
+def test_native_failures(tmpdir, monkeypatch):
+    builds = []
+
+    def failing_build(name, code, cache_directory, path):
+        builds.append(name)
+        raise RuntimeError("no compiler")
+
+    monkeypatch.setattr(native, "CACHE_DIRECTORY", str(tmpdir))
+    monkeypatch.setattr(native, "cythonize", lambda *args, **kwargs: [])
+    monkeypatch.setattr(native, "_build", failing_build)
+    monkeypatch.setattr(native, "_modules", {})
+    monkeypatch.setattr(native, "_failures", {})
+    record = {"name": "timothy", "age": "29", "contact": []}
+    expected = Schema(text=EXAMPLE_SCHEMA)(dict(record))
+    assert builds == []
+
+    for _ in range(2):
+        with pytest.warns(UserWarning, match="no compiler"):
+            assert Schema(text=EXAMPLE_SCHEMA, native=True)(dict(record)) == expected
+    assert len(builds) == 1
+
+    monkeypatch.setattr(native, "cythonize", False)
+    with pytest.warns(UserWarning, match="not installed"):
+        assert Schema(text=EXAMPLE_SCHEMA, native=True)(dict(record)) == expected
@@ -0,0 +1,122 @@
+import pytest
+from koalified.schema import Schema
+
+pandas = pytest.importorskip("pandas")
+from koalified.pandas import validate_frame  # noqa: E402
+
+EXAMPLE_SCHEMA = """
+name~2:
+    - str= longest=5:int cut=true:bool lower=true:bool
+    - match! ^[a-z]+$
+age: [int= minimum=1:int, float?=]
+color: one_of! red blue
+phone: phone=
+tags+: str= upper=true:bool
+note:
+"""
+
+RECORDS = [
+    {"name": "Timothy", "age": 5, "color": "Red", "phone": "410-555-0100", "tags": ["a", "b"]},
+    {"name": "al1", "age": 0, "color": "green", "phone": None, "tags": "c", "note": "hi"},
+    {"name": "", "age": None, "color": "blue", "phone": "nope", "tags": None, "note": None},
+]
+
+
+def _expected(schema, records, field_scores=False):
+    rows = []
+    for record in records:
+        output = schema(record)
+        metadata = output.pop("__metadata__")
+        output["score"] = metadata["score"]
+        if "explain_scores" in metadata:
+            output["explain_scores"] = metadata["explain_scores"]
+        if field_scores:
+            output.update(
+                ("score_" + field, value) for field, value in metadata["field_scores"].items()
+            )
+        rows.append(output)
+    return rows
+
+
+def _rows(frame):
+    return [
+        {key: value for key, value in row.items() if value is not None and value == value}
+        for row in frame.to_dict("records")
+    ]
+
+
+def test_validate_frame():
+    schema = Schema(text=EXAMPLE_SCHEMA)
+    result = validate_frame(pandas.DataFrame(RECORDS), schema, chunksize=2)
+    assert list(result.index) == [0, 1, 2]
+    assert _rows(result) == _expected(schema, RECORDS)
+    assert result["name"].tolist() == ["timot", None, None]
+    assert result["age"].tolist() == [5.0, None, None]
+
+
+def test_validate_frame_field_scores():
+    schema = Schema(text=EXAMPLE_SCHEMA, min_score=0.5)
+    result = validate_frame(pandas.DataFrame(RECORDS), schema, field_scores=True)
+    scores = Schema(text=EXAMPLE_SCHEMA, score_fields=True)
+    expected = _expected(scores, RECORDS, field_scores=True)
+    for row, expected_row in zip(_rows(result), expected):
+        if row.pop("rejected"):
+            assert expected_row["score"] < 0.5 and row == {"score": expected_row["score"]}
+        else:
+            assert row == expected_row
+
+    # rows validated one at a time, here because of the `**` field, are rejected the same way
+    extra = Schema(text=EXAMPLE_SCHEMA + "'**':", min_score=0.5)
+    rows = _rows(validate_frame(pandas.DataFrame(RECORDS), extra, field_scores=True))
+    assert [set(row) for row in rows if row["rejected"]] == [{"score", "rejected"}]
+
+
+def test_validate_frame_row_options():
+    records = [dict(RECORDS[0], name="tim"), RECORDS[1]]
+    schema = Schema(text=EXAMPLE_SCHEMA, explain=True)
+    result = validate_frame(pandas.DataFrame(records), schema)
+    assert _rows(result) == _expected(schema, records)
+    assert result["explain_scores"].map(len).all()
+
+    schema = Schema(text=EXAMPLE_SCHEMA, fail_fast=False)
+    result = validate_frame(pandas.DataFrame(records), schema)
+    assert _rows(result) == _expected(schema, records)
+
+
+def test_validate_frame_required():
+    schema = Schema(text="name!: [str, one_of! tim al]")
+    assert validate_frame(pandas.DataFrame([{"name": "tim"}]), schema)["score"].tolist() == [1.0]
+    with pytest.raises(ValueError):
+        validate_frame(pandas.DataFrame([{"name": "tim"}, {"name": "bob"}]), schema)
+    with pytest.raises(ValueError):
+        validate_frame(pandas.DataFrame([{"name": "tim"}, {"name": ""}]), schema)
+
+
+def test_validate_frame_fallbacks():
+    schema = Schema(text="count: int=")
+    records = [{"count": 2**70}, {"count": 3}]
+    result = validate_frame(pandas.DataFrame(records), schema)
+    assert _rows(result) == _expected(schema, records)
+
+    schema = Schema(text="name?: str\nnote:")
+    with pytest.raises(ZeroDivisionError):
+        schema({"name": "tim", "note": "x"})
+    with pytest.raises(ZeroDivisionError):
+        validate_frame(pandas.DataFrame([{"name": "tim", "note": "x"}]), schema)
+
+
+def test_validate_frame_nested():
+    schema = Schema(text="name: str\ncontact:\n    phone: str\n'**':", score_fields=True)
+    records = [{"name": "tim", "contact": {"phone": "410"}, "other": 1}]
+    result = validate_frame(pandas.DataFrame(records), schema, field_scores=True)
+    assert result.to_dict("records") == [
+        {
+            "name": "tim",
+            "contact": {"phone": "410"},
+            "other": 1,
+            "score": 1.0,
+            "score_name": 1.0,
+            "score_contact.phone": 1.0,
+            "score_**": 1.0,
+        }
+    ]
@@ -1,6 +1,8 @@
+import json
 import os
 
 import pytest
+from koalified import native
 from koalified.schema import Schema
 
 EXAMPLE_SCHEMA = """
@@ -37,3 +39,267 @@ def test_load_schema():
     schema = Schema(text=EXAMPLE_SCHEMA)
     schema.compiled()
     assert schema({"contact": [{"phone": "410"}]})
+
+
+def test_export_schema(tmpdir):
+    schema = Schema(text=EXAMPLE_SCHEMA)
+    artifact_path = str(tmpdir.join("schema.json"))
+    artifact = schema.export(artifact_path)
+
+    loaded = Schema(uri=artifact_path)
+    assert loaded.definition == schema.definition
+    assert loaded.version == schema.version
+    assert Schema(text=artifact).definition == schema.definition
+
+    record = {"name": "tim", "age": 5, "contact": [{"phone": "410"}]}
+    assert loaded(record) == schema(record)
+    assert Schema(text="{name: str}").definition == {"name": "str"}
+
+
+def test_extra_fields():
+    schema = Schema(text="name: str\n'**': int=")
+    assert schema({"name": "tim", "age": "5", "height": None, "weight": "a"}) == {
+        "__metadata__": {"schema_version": schema.version, "score": (1 + 2 / 3) / 2},
+        "name": "tim",
+        "age": 5,
+        "weight": "a",
+    }
+
+    schema = Schema(text="name: str\n'**': int=", passthrough_extra=True)
+    assert schema({"name": "tim", "age": "5", "height": None}) == {
+        "__metadata__": {"schema_version": schema.version, "score": 1.0},
+        "name": "tim",
+        "age": "5",
+    }
+
+    schema = Schema(text="name: str\n'**': []")
+    assert schema({"name": "tim", "age": "5"})["age"] == "5"
+
+
+def test_nested_multiple():
+    text = "contact+:\n    phone: int=\n    hours+:\n        day: str"
+    record = {"contact": [{"phone": "1", "hours": [{"day": "mon"}]}, {"phone": "2", "hours": []}]}
+    for cache in (None, 10):
+        assert Schema(text=text, cache=cache)(record)["contact"] == [
+            {"phone": 1, "hours": [{"day": "mon"}]},
+            {"phone": 2, "hours": []},
+        ]
+
+
+def test_min_score():
+    schema = Schema(text="name: str\nage~3: int=\nphone: int", min_score=0.6)
+    assert schema({"name": "tim", "age": "5"}) == {
+        "__metadata__": {"schema_version": schema.version, "score": 0.8},
+        "name": "tim",
+        "age": 5,
+    }
+    assert schema({"name": "tim", "phone": "410"}) == {
+        "__metadata__": {"schema_version": schema.version, "score": 0.4, "rejected": True}
+    }
+    assert schema({"age": "5"}) == {
+        "__metadata__": {"schema_version": schema.version, "score": 0.6},
+        "age": 5,
+    }
+    assert schema({"age": "old"})["__metadata__"]["rejected"]
+
+    schema = Schema(text="name: str\nage!: int", min_score=0.6, required_first=True)
+    with pytest.raises(ValueError):
+        schema({"name": "tim"})
+
+    schema = Schema(text="a~5: int\nb!: str", min_score=0.9)
+    with pytest.raises(ValueError):
+        schema({"a": "x"})
+
+    text = "\n".join("f{0}~0.{0}3: int".format(index) for index in range(1, 8))
+    text += "\ng:\n    x~0.7: int\n    y: str\n'**': int"
+    record = {"f{}".format(index): str(index) if index % 3 else "x" for index in range(1, 10)}
+    record.update({"g": {"x": "1", "y": "y"}, "extra": "2"})
+    plain = Schema(text=text, score_fields=True, explain=True)
+    for min_score in (0.0, plain(record)["__metadata__"]["score"]):
+        schema = Schema(text=text, score_fields=True, explain=True, min_score=min_score)
+        assert schema.apply_bytes(json.dumps(record)) == plain.apply_bytes(json.dumps(record))
+
+
+def test_hoisted_output_order():
+    text = "a: str\nb!: str\nc: int\nd!+: int="
+    record = b'{"a":"x","b":"y","c":"z","d":["1","2"]}'
+    for explain in (False, True):
+        plain = Schema(text=text, score_fields=True, explain=explain)
+        hoisted = Schema(text=text, score_fields=True, explain=explain, required_first=True)
+        assert hoisted.apply_bytes(record) == plain.apply_bytes(record)
+        assert hoisted.apply_bytes(b'{"b":"y","d":"3"}') == plain.apply_bytes(b'{"b":"y","d":"3"}')
+
+    ordering = {"fields": ["c", "b"], "validators": {}}
+    assert Schema(text=text, ordering=ordering).apply_bytes(record) == Schema(
+        text=text
+    ).apply_bytes(record)
+
+
+def test_profile_ordering(tmpdir):
+    text = """
+name:
+    - str=
+    - match [A-z]
+age!:
+    - str longest=3:int
+    - int!
+    - int=
+code!: match! [A-Z]{3}
+"""
+    records = [
+        {"name": "tim", "age": "12", "code": "ABC"},
+        {"name": "x", "age": "a", "code": "ABC"},
+        {"age": "5"},
+        {"age": "7", "code": "ab"},
+        {"name": "bob", "age": "1234", "code": "XYZ"},
+    ]
+    plain = Schema(text=text, score_fields=True)
+    profiled = Schema(text=text, score_fields=True, profile=4)
+    for record in records[:4]:
+        try:
+            profiled(record)
+        except ValueError:
+            pass
+    assert profiled.profiler is None
+    assert sorted(profiled.ordering["fields"]) == ["age", "code"]
+    assert profiled.ordering["validators"] == {"age": [1, 0, 2]}
+
+    for record in records:
+        try:
+            expected = plain(record)
+        except ValueError:
+            with pytest.raises(ValueError):
+                profiled(record)
+        else:
+            assert profiled(record) == expected
+
+    ordering_path = profiled.save_ordering(str(tmpdir.join("ordering.json")))
+    assert Schema(text=text, ordering=ordering_path).ordering == profiled.ordering
+    assert Schema(text="name: str", ordering=ordering_path).ordering is None
+
+
+def test_resolve_types():
+    with pytest.raises(ValueError, match="Unknown type"):
+        Schema(text="name: [str, nope]")
+    with pytest.raises(ValueError, match="pure"):
+        Schema(text="name: shout", supported_types={"shout": str.upper}, cache=10)
+    assert Schema(text="name: str", cache=10).cache is not None
+
+    text = 'code!: ["match! ^[A-Z]+$", "str! longest=3:int"]'
+    with pytest.raises(ValueError, match="does not match"):
+        Schema(text=text)({"code": "abcd"})
+
+    # with cost_order, the cheaper str check runs before the regular expression
+    schema = Schema(text=text, cost_order=True)
+    with pytest.raises(ValueError, match="longer"):
+        schema({"code": "abcd"})
+    assert schema({"code": "ABC"})["code"] == "ABC"
+
+
+def test_project(monkeypatch):
+    text = """
+name: str
+age!: int=
+contact:
+    phone!: str
+    email: str
+"""
+    schema = Schema(text=text, score_fields=True)
+    project = schema.project(["contact.phone", "name"])
+    assert schema.project(["name", "contact.phone"]) is project
+    assert project({"name": "tim", "age": "x", "contact": {"phone": "410"}}) == {
+        "__metadata__": {
+            "schema_version": schema.version,
+            "score": 1.0,
+            "field_scores": {"name": 1.0, "contact.phone": 1.0},
+        },
+        "name": "tim",
+        "contact": {"phone": "410"},
+    }
+    assert project({"contact": {"phone": "410"}})["__metadata__"]["score"] == 0.5
+
+    with pytest.raises(ValueError):
+        schema.project(["name"], required=True)({"name": "tim"})
+    assert schema.project(["name"], required=True)({"name": "tim", "age": "5"})["age"] == 5
+    assert schema.project(["contact"])({"contact": {"phone": "1", "email": "a"}})["contact"] == {
+        "phone": "1",
+        "email": "a",
+    }
+    unscored = Schema(text="a: str\nb?: int\nc:")
+    assert unscored.project(["c"])({"c": "1"}) == {
+        "__metadata__": {"schema_version": unscored.version, "score": None},
+        "c": "1",
+    }
+    assert unscored.project(["b"])({"b": "3"})["__metadata__"]["score"] is None
+    with pytest.raises(ValueError):
+        schema.project(["missing"])
+    with pytest.raises(ValueError):
+        schema.project(["name.first"])
+
+    native_schema = Schema(text=text, native=True)
+    monkeypatch.setattr(native, "load", pytest.fail)
+    assert native_schema.project(["name"])({"name": "tim"})["name"] == "tim"
+
+
+def test_revalidate():
+    text = """
+name~2: [str= lower=true:bool, str longest=5:int]
+age!: [int=, int minimum=18:int]
+note:
+contact:
+    phone: str
+    email~0.3: [str, "match! ^.+@.+$"]
+'**':
+"""
+    schema = Schema(text=text, score_fields=True)
+    record = {
+        "name": "Tim",
+        "age": "20",
+        "note": "x",
+        "contact": {"phone": "410", "email": "a@b"},
+        "other": 1,
+    }
+    previous = schema(record)
+    patches = [
+        {"name": "Timothy"},
+        {"name": None, "note": None},
+        {"age": "12", "contact": {"email": "nope"}},
+        {"contact": {"phone": None, "email": "c@d"}, "other": None, "more": "y"},
+        {},
+    ]
+    for changes in patches:
+        updated = dict(record, **changes)
+        updated["contact"] = dict(record["contact"], **changes.get("contact", {}))
+        assert json.dumps(schema.revalidate(previous, changes)) == json.dumps(schema(updated))
+    assert previous == schema(record)
+
+    # patched fields that add nothing to the possible score, or were missing before
+    unscored = Schema(text="a: str\nb?: int\nc:\n'**':", score_fields=True)
+    for changes in ({"b": "3"}, {"c": "1"}, {"b": "3", "a": None}, {"more": 2}):
+        updated = unscored({"a": "x", "other": 1, **changes})
+        revalidated = unscored.revalidate(unscored({"a": "x", "other": 1}), changes)
+        assert json.dumps(revalidated) == json.dumps(updated)
+
+    with pytest.raises(ValueError):
+        schema.revalidate(previous, {"age": None})
+    with pytest.raises(ValueError):
+        Schema(text=text).revalidate(previous, {"name": "x"})
+    with pytest.raises(ValueError):
+        Schema(text="name: str\ncontact+:\n    phone: str", score_fields=True).revalidate(
+            {"__metadata__": {"schema_version": "x"}}, {}
+        )
+
+
+def test_prepared_patterns():
+    text = """
+code: "match ^[A-Z]{3}$"
+kind!: match_any! ^a ^b[0-9] ^c
+"""
+    schema = Schema(text=text, score_fields=True)
+    assert schema({"code": "ABC", "kind": "b1"})["__metadata__"]["score"] == 1.0
+    assert schema({"code": "abc", "kind": "cat"})["__metadata__"]["field_scores"]["code"] == 0.5
+    with pytest.raises(ValueError):
+        schema({"code": "ABC", "kind": "b"})
+
+    schema = Schema(text=r"k: 'match_any! ^(a)\1$ ^(b)\1$'")
+    assert schema({"k": "bb"})["__metadata__"]["score"] == 1.0
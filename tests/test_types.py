@@ -1,22 +1,29 @@
 from ipaddress import ip_address
 
 import pytest
+from koalified import types
 from koalified.types import (
+    TypeRegistry,
+    built_in,
+    compile_pattern,
     country,
     date,
     date_time,
     floating_number,
     ip,
     match,
+    match_any,
     number,
     one_of,
     phonenumber,
     postal,
+    set_regex_engine,
     strict_date,
     strict_datetime,
     string,
     string_boolean,
 )
+from koalified.types import registry as registry_of
 
 
 def test_string_boolean():
@@ -94,6 +101,44 @@ def test_match():
     assert match("a", "[A-z]") == "a"
     with pytest.raises(ValueError):
         match("1", "[A-z]")
+    assert match("a", compile_pattern("[A-z]")) == "a"
+    with pytest.raises(ValueError, match=r"\[A-z\]"):
+        match("1", compile_pattern("[A-z]"))
+
+
+def test_match_any():
+    assert match_any("b2", "a", "b[0-9]") == "b2"
+    with pytest.raises(ValueError):
+        match_any("c", "a", "b[0-9]")
+
+    (combined,) = built_in.info("match_any").prepare("a", "b[0-9]")
+    assert match_any("b2", combined) == "b2"
+    with pytest.raises(ValueError):
+        match_any("c", combined)
+    # patterns with groups are kept apart, so their backreferences keep working
+    separate = built_in.info("match_any").prepare("(?P<x>a)", "(?P<x>b)")
+    assert len(separate) == 2
+    assert match_any("b", *separate) == "b"
+    backreferences = built_in.info("match_any").prepare(r"^(a)\1$", r"^(b)\1$")
+    assert len(backreferences) == 2
+    assert match_any("bb", *backreferences) == "bb"
+
+
+def test_regex_engine():
+    class Engine(object):
+        @staticmethod
+        def compile(regex):
+            if "(" in regex:
+                raise ValueError("Unsupported")
+            return ("engine", regex)
+
+    previous = types.regex_engine
+    set_regex_engine(Engine)
+    try:
+        assert compile_pattern("[a-z]") == ("engine", "[a-z]")
+        assert compile_pattern("(a)").match("a")
+    finally:
+        set_regex_engine(previous)
 
 
 def test_ip():
@@ -187,3 +232,23 @@ def test_country():
         country("NOT A COUNTRY")
     with pytest.raises(Exception):
         country(21332121)
+
+
+def test_type_registry():
+    registry = TypeRegistry()
+
+    @registry.register("upper", pure=True, cost=2)
+    def upper(value):
+        return value.upper()
+
+    registry["lower"] = str.lower
+    assert registry.resolve("upper") is upper
+    assert registry.info("upper") == (True, False, False, 2, None)
+    assert registry.info("lower").cost is None
+    assert registry.copy().info("upper").pure
+    with pytest.raises(ValueError):
+        registry.resolve("missing")
+
+    custom = registry_of(dict(built_in, str=len))
+    assert custom.info("int").vectorizable
+    assert not custom.info("str").pure